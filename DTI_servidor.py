@@ -27,17 +27,22 @@ from dataclasses import dataclass
 from enum import Enum
 import os
 from config import BROKER_BACKEND_URL, AULAS_REGISTRO_FILE, ASIGNACIONES_LOG_FILE, HEARTBEAT_URL, SYNC_URL
+from config import MODO_DEPURACION, BROKER_MODO_PLANIFICACION
 import select
 import sys
 import threading
 import time
 import uuid
 from monitor_metricas import obtener_monitor
+from serializacion import serializar, deserializar
 
 # Configuración para el latido y sincronización
 INTERVALO_LATIDO = 2.0  # segundos entre cada latido (heartbeat)
 INTERVALO_SINC = 10.0   # intervalo de sincronización de estado
 
+# Campos que asignar_aulas lee de cada solicitud
+CAMPOS_SOLICITUD = ("facultad", "programa", "semestre", "salones", "laboratorios")
+
 
 # =============================================================================
 # Definiciones de clases y enumeraciones
@@ -126,7 +131,7 @@ class ServidorDTI:
         thread_id = threading.get_ident()
         
         # Registrar inicio del procesamiento para métricas
-        tiempo_inicio_servidor = time.time()
+        tiempo_inicio_servidor = time.monotonic_ns()
         
         try:
                 facultad = solicitud["facultad"]
@@ -142,7 +147,7 @@ class ServidorDTI:
                 
                 if len(salones_disponibles) < num_salones:
                     # Registrar métricas incluso para solicitudes no disponibles
-                    tiempo_respuesta = time.time() - tiempo_inicio_servidor
+                    tiempo_respuesta = (time.monotonic_ns() - tiempo_inicio_servidor) / 1e9
                     self.monitor_metricas.registrar_tiempo_respuesta_servidor(
                         tiempo_respuesta,
                         facultad,
@@ -178,7 +183,7 @@ class ServidorDTI:
                 total_disponible = len(laboratorios_disponibles) + len(salones_convertibles)
                 if total_disponible < num_laboratorios:
                     # Registrar métricas incluso para solicitudes no disponibles
-                    tiempo_respuesta = time.time() - tiempo_inicio_servidor
+                    tiempo_respuesta = (time.monotonic_ns() - tiempo_inicio_servidor) / 1e9
                     self.monitor_metricas.registrar_tiempo_respuesta_servidor(
                         tiempo_respuesta,
                         facultad,
@@ -245,7 +250,7 @@ class ServidorDTI:
                 )
 
                 # Registrar métricas de tiempo de respuesta del servidor
-                tiempo_respuesta = time.time() - tiempo_inicio_servidor
+                tiempo_respuesta = (time.monotonic_ns() - tiempo_inicio_servidor) / 1e9
                 self.monitor_metricas.registrar_tiempo_respuesta_servidor(
                     tiempo_respuesta,
                     facultad,
@@ -256,7 +261,7 @@ class ServidorDTI:
 
         except Exception as e:
             # Registrar métricas incluso en caso de error
-            tiempo_respuesta = time.time() - tiempo_inicio_servidor
+            tiempo_respuesta = (time.monotonic_ns() - tiempo_inicio_servidor) / 1e9
             facultad = solicitud.get("facultad", "Desconocida")
             self.monitor_metricas.registrar_tiempo_respuesta_servidor(
                 tiempo_respuesta,
@@ -296,27 +301,52 @@ class ServidorDTI:
         return estadisticas
     
     def enviar_estado_para_sincronizacion(self):
-        """Prepara y envía el estado actual del servidor para sincronización con el backup."""
+        """
+        Prepara y envía el estado actual del servidor para sincronización con el backup.
+        
+        Las aulas se envían por columnas (una lista por campo) en lugar de un
+        diccionario por aula, para no repetir los nombres de los campos en cada
+        elemento del mensaje. El respaldo reconstruye los diccionarios al recibirlo.
+        """
         try:
-            # Convertir objetos Aula a diccionarios para poder serializarlos
-            aulas_dict = {}
-            for aula_id, aula in self.aulas.items():
-                aulas_dict[aula_id] = {
-                    "id": aula.id,
-                    "tipo": aula.tipo.value,
-                    "estado": aula.estado.value,
-                    "capacidad": aula.capacidad,
-                    "facultad": aula.facultad,
-                    "programa": aula.programa,
-                    "fecha_solicitud": aula.fecha_solicitud,
-                    "fecha_asignacion": aula.fecha_asignacion
-                }
+            aulas = list(self.aulas.values())
+            columnas = {
+                "id": [aula.id for aula in aulas],
+                "tipo": [aula.tipo.value for aula in aulas],
+                "estado": [aula.estado.value for aula in aulas],
+                "capacidad": [aula.capacidad for aula in aulas],
+                "facultad": [aula.facultad for aula in aulas],
+                "programa": [aula.programa for aula in aulas],
+                "fecha_solicitud": [aula.fecha_solicitud for aula in aulas],
+                "fecha_asignacion": [aula.fecha_asignacion for aula in aulas]
+            }
             
-            return {"aulas": aulas_dict}
+            return {"aulas_columnas": columnas}
         except Exception as e:
             logging.error(f"Error preparando estado para sincronización: {e}")
             return {"error": str(e)}
 
+def decodificar_solicitud(mensaje):
+    """
+    Decodifica una solicitud y comprueba que tenga los campos requeridos.
+    
+    Args:
+        mensaje (bytes): Solicitud serializada recibida del broker
+        
+    Returns:
+        tuple: (solicitud, None) si es válida, o (None, mensaje_error)
+    """
+    try:
+        solicitud = deserializar(mensaje)
+    except ValueError:
+        return None, "Formato de solicitud inválido"
+    if not isinstance(solicitud, dict):
+        return None, "Formato de solicitud inválido"
+    for campo in CAMPOS_SOLICITUD:
+        if campo not in solicitud:
+            return None, f"Falta campo requerido: '{campo}'"
+    return solicitud, None
+
 def limpiar_sistema(servidor):
     """Limpia todas las asignaciones y registros del sistema."""
     try:
@@ -385,7 +415,7 @@ def iniciar_sincronizacion(contexto, servidor):
         # Enviar estado periódicamente
         while not servidor.detenido:
             estado = servidor.enviar_estado_para_sincronizacion()
-            socket.send_string(json.dumps(estado))
+            socket.send(serializar(estado))
             time.sleep(INTERVALO_SINC)
     except Exception as e:
         logging.error(f"Error en servicio de sincronización: {e}")
@@ -404,7 +434,8 @@ def main():
     socket = contexto.socket(zmq.DEALER)
     
     # Crear una identidad única para este worker
-    worker_id = str(uuid.uuid4()).encode()
+    # Identidad binaria de 16 bytes (ZeroMQ reserva las que empiezan con el byte cero)
+    worker_id = b"\x01" + uuid.uuid4().bytes[1:]
     socket.setsockopt(zmq.IDENTITY, worker_id)
     
     # Conectar con el broker (backend)
@@ -420,48 +451,52 @@ def main():
     print(f"| {'Servicio Latidos':<25} | {'ACTIVO':<15} | {HEARTBEAT_URL:<30} |")
     print(f"| {'Sincronización':<25} | {'ACTIVO':<15} | {SYNC_URL:<30} |")
     print(f"| {'Conexión Broker':<25} | {'CONECTADO':<15} | {BROKER_BACKEND_URL:<30} |")
-    print(f"| {'Worker ID':<25} | {'ASIGNADO':<15} | {worker_id.decode()[:30]:<30} |")
+    print(f"| {'Worker ID':<25} | {'ASIGNADO':<15} | {worker_id.hex()[:30]:<30} |")
     print("-"*80)
     print("| COMANDOS DISPONIBLES: 'limpiar' para reiniciar | 'salir' para terminar |")
     print("="*80)
     
+    # Con el broker nativo (proxy ROUTER-DEALER) no hay registro con READY:
+    # libzmq reparte las solicitudes entre los workers conectados
+    planificacion_nativa = BROKER_MODO_PLANIFICACION == "nativo"
+    
     # Enviar mensaje inicial para registrarse con el broker
-    socket.send(b"READY")
+    if not planificacion_nativa:
+        socket.send(b"READY")
     
-    def procesar_solicitud(client_id, mensaje):
-        """Procesa una solicitud y envía la respuesta de vuelta al broker."""
-        try:
-            solicitud = json.loads(mensaje)
-            print(f"\nSolicitud recibida de {solicitud.get('facultad', 'desconocido')}: {mensaje}")
-            
-            # Procesar la solicitud
-            respuesta = servidor.asignar_aulas(solicitud)
-            
-            # Mostrar estadísticas
+    def procesar_solicitud(sobre, mensaje):
+        """
+        Procesa una solicitud y envía la respuesta de vuelta al broker.
+        
+        Args:
+            sobre (list): Frames de enrutamiento recibidos antes del payload
+                ([b"", client_id, etiqueta, b""] con el broker personalizado,
+                [client_id, etiqueta, b""] con el nativo); se devuelven tal
+                cual para que la facultad correlacione la respuesta
+            mensaje (bytes): Solicitud serializada
+        """
+        solicitud, error = decodificar_solicitud(mensaje)
+        if error:
+            logging.error(f"Error procesando solicitud: {error}")
+            # Enviar mensaje de error
+            socket.send_multipart(sobre + [serializar({"error": error})])
+            return
+        
+        print(f"\nSolicitud recibida de {solicitud['facultad']}: {solicitud}")
+        
+        # Procesar la solicitud (asignar_aulas devuelve {"error": ...} si falla)
+        respuesta = servidor.asignar_aulas(solicitud)
+        
+        # Mostrar estadísticas (solo en modo depuración: recorre todas las aulas)
+        if MODO_DEPURACION:
             estadisticas = servidor.obtener_estadisticas()
             print("\nEstadísticas actuales:")
             print(json.dumps(estadisticas, indent=2))
-            
-            # Enviar respuesta al broker
-            socket.send_multipart([
-                b"",              # Empty frame
-                client_id,        # Client ID
-                b"",              # Empty delimiter
-                json.dumps(respuesta).encode("utf-8")  # Response
-            ])
-            
-            logging.info(f"Respuesta enviada a facultad: {solicitud.get('facultad')}")
-            
-        except Exception as e:
-            error_msg = f"Error procesando solicitud: {e}"
-            logging.error(error_msg)
-            # Enviar mensaje de error
-            socket.send_multipart([
-                b"",              # Empty frame
-                client_id,        # Client ID
-                b"",              # Empty delimiter
-                json.dumps({"error": str(e)}).encode("utf-8")
-            ])
+        
+        # Enviar respuesta al broker con el mismo sobre de enrutamiento
+        socket.send_multipart(sobre + [serializar(respuesta)])
+        
+        logging.info(f"Respuesta enviada a facultad: {solicitud['facultad']}")
     
     try:
         while True:
@@ -479,16 +514,14 @@ def main():
                 if socket.poll(100) == zmq.POLLIN:
                     # Recibir mensaje del broker
                     frames = socket.recv_multipart()
-                    if len(frames) >= 4:
-                        empty = frames[0]      # Should be empty
-                        client_id = frames[1]  # ID of client
-                        delimiter = frames[2]  # Should be empty
-                        request = frames[3]    # Request data
+                    if len(frames) >= 3:
+                        sobre = frames[:-1]    # Routing envelope (client ID and delimiters)
+                        request = frames[-1]   # Request data
                         
                         # Procesar en un hilo separado
-                        t = threading.Thread(target=procesar_solicitud, args=(client_id, request.decode("utf-8")))
+                        t = threading.Thread(target=procesar_solicitud, args=(sobre, request))
                         t.start()
-                    else:
+                    elif not planificacion_nativa:
                         # Recibimos un mensaje que no entendemos, responder como READY
                         socket.send(b"READY")
             except zmq.ZMQError as e:
@@ -29,9 +29,11 @@ from dataclasses import dataclass, asdict
 from enum import Enum
 
 # Importar las mismas definiciones que el servidor principal
-from DTI_servidor import Aula, TipoAula, EstadoAula, ServidorDTI, limpiar_sistema
+from DTI_servidor import Aula, TipoAula, EstadoAula, ServidorDTI, limpiar_sistema, decodificar_solicitud
 from config import BROKER_BACKEND_URL, AULAS_REGISTRO_FILE, ASIGNACIONES_LOG_FILE
-from config import HEARTBEAT_URL, SYNC_URL, RESPALDO_ESTADO_ARCHIVO
+from config import HEARTBEAT_URL, SYNC_URL, RESPALDO_ESTADO_ARCHIVO, MODO_DEPURACION
+from config import BROKER_MODO_PLANIFICACION
+from serializacion import serializar, deserializar
 
 # Configuración para el latido y sincronización
 INTERVALO_LATIDO = 2.0    # segundos entre cada latido (heartbeat)
@@ -173,7 +175,7 @@ class ServidorDTIRespaldo:
         while True:
             try:
                 if socket.poll(1000) == zmq.POLLIN:
-                    mensaje = socket.recv_string()
+                    mensaje = socket.recv()
                     # Procesar el mensaje de sincronización
                     self.procesar_mensaje_sinc(mensaje)
             except Exception as e:
@@ -183,7 +185,15 @@ class ServidorDTIRespaldo:
     def procesar_mensaje_sinc(self, mensaje):
         """Procesa un mensaje de sincronización del servidor principal."""
         try:
-            datos_sinc = json.loads(mensaje)
+            datos_sinc = deserializar(mensaje)
+            if "aulas_columnas" in datos_sinc:
+                # Reconstruir un diccionario por aula a partir del envío por columnas
+                columnas = datos_sinc.pop("aulas_columnas")
+                campos = list(columnas.keys())
+                datos_sinc["aulas"] = {
+                    valores[0]: dict(zip(campos, valores))
+                    for valores in zip(*columnas.values())
+                }
             self.estado_respaldo = datos_sinc
             logging.info("Estado sincronizado con servidor principal")
             
@@ -293,7 +303,8 @@ class ServidorDTIRespaldo:
         try:
             socket = self.contexto.socket(zmq.DEALER)
             # Crear una identidad única para este worker
-            id_worker = str(uuid.uuid4()).encode()
+            # Identidad binaria de 16 bytes (ZeroMQ reserva las que empiezan con el byte cero)
+            id_worker = b"\x01" + uuid.uuid4().bytes[1:]
             socket.setsockopt(zmq.IDENTITY, id_worker)
             
             # Conectar con el broker (backend)
@@ -301,7 +312,7 @@ class ServidorDTIRespaldo:
             
             logging.info(f"Conectando al broker como worker en {BROKER_BACKEND_URL}")
             print(f"| CONEXION: Broker worker en {BROKER_BACKEND_URL}")
-            print(f"| WORKER ID: {id_worker.decode()}")
+            print(f"| WORKER ID: {id_worker.hex()}")
             
             # Ya no enviamos el READY aquí, lo haremos en el hilo worker
             # para asegurarnos de que el hilo esté listo para recibir respuestas
@@ -309,7 +320,7 @@ class ServidorDTIRespaldo:
             # Iniciar hilo para procesar solicitudes
             threading.Thread(target=self.hilo_worker, args=(socket,), daemon=True).start()
             
-            logging.info(f"Registrado correctamente en el broker con ID: {id_worker.decode()}")
+            logging.info(f"Registrado correctamente en el broker con ID: {id_worker.hex()}")
             print("| REGISTRO: Correctamente en el broker")
         except Exception as e:
             logging.error(f"Error registrando en broker: {e}")
@@ -321,7 +332,7 @@ class ServidorDTIRespaldo:
             logging.info("Hilo worker iniciado")
             
             # Enviar mensaje inicial READY para registrarse con el broker
-            socket.send(b"READY")
+            self._enviar_ready(socket)
             logging.info("Enviado mensaje READY inicial al broker (registro)")
             print("| WORKER: Respaldo listo para recibir solicitudes")
             
@@ -339,11 +350,9 @@ class ServidorDTIRespaldo:
                     if can_accept_more and socket.poll(100) == zmq.POLLIN:
                         # Recibir mensaje del broker
                         frames = socket.recv_multipart()
-                        if len(frames) >= 4:
-                            vacio = frames[0]      # Should be empty
-                            id_cliente = frames[1]  # ID of client
-                            delimitador = frames[2]  # Should be empty
-                            peticion = frames[3]    # Request data
+                        if len(frames) >= 3:
+                            sobre = frames[:-1]    # Sobre de enrutamiento (ID de cliente y delimitadores)
+                            peticion = frames[-1]  # Request data
                             
                             # Incrementar contador de solicitudes activas
                             with self.active_requests_lock:
@@ -355,7 +364,7 @@ class ServidorDTIRespaldo:
                             # Procesar solicitud en un nuevo hilo
                             t = threading.Thread(
                                 target=self.procesar_solicitud_con_tracking, 
-                                args=(socket, id_cliente, peticion.decode("utf-8"))
+                                args=(socket, sobre, peticion)
                             )
                             t.daemon = True
                             t.start()
@@ -402,18 +411,18 @@ class ServidorDTIRespaldo:
         except Exception as e:
             logging.error(f"Error en hilo worker: {e}")
     
-    def procesar_solicitud_con_tracking(self, socket, id_cliente, mensaje):
+    def procesar_solicitud_con_tracking(self, socket, sobre, mensaje):
         """Procesa una solicitud con seguimiento del estado."""
         request_id = str(uuid.uuid4())[:8]  # ID corto para seguimiento
         logging.info(f"Iniciando procesamiento de solicitud {request_id}")
         try:
-            self.procesar_solicitud(socket, id_cliente, mensaje, request_id)
+            self.procesar_solicitud(socket, sobre, mensaje, request_id)
         except Exception as e:
             logging.error(f"Error no capturado en solicitud {request_id}: {e}")
             # Intentar enviar error al cliente
             try:
-                self._enviar_error(socket, id_cliente, f"Error interno: {str(e)}")
-            except:
+                self._enviar_error(socket, sobre, f"Error interno: {str(e)}")
+            except Exception:
                 logging.error(f"No se pudo enviar mensaje de error para solicitud {request_id}")
         finally:
             # Siempre liberar recursos cuando terminamos
@@ -424,86 +433,87 @@ class ServidorDTIRespaldo:
             # Liberar el semáforo
             self.request_semaphore.release()
     
-    def procesar_solicitud(self, socket, id_cliente, mensaje, request_id=''):
-        """Procesa una solicitud y envía la respuesta de vuelta al broker."""
+    def procesar_solicitud(self, socket, sobre, mensaje, request_id=''):
+        """
+        Procesa una solicitud y envía la respuesta de vuelta al broker.
+        
+        Args:
+            socket (zmq.Socket): Socket DEALER conectado al broker
+            sobre (list): Frames de enrutamiento recibidos antes del payload,
+                que se devuelven tal cual con la respuesta
+            mensaje (bytes): Solicitud serializada
+            request_id (str): ID corto para seguimiento en el log
+        """
         if not self.servidor_activo or not self.servidor:
             logging.warning(f"[{request_id}] Intento de procesar solicitud con servidor inactivo")
             return
             
-        try:
-            solicitud = json.loads(mensaje)
-            facultad = solicitud.get('facultad', 'desconocido')
-            programa = solicitud.get('programa', 'desconocido')
-            
-            logging.info(f"[{request_id}] Procesando solicitud de {facultad} - {programa}")
-            print(f"\nSOLICITUD [{request_id}]: {facultad} - {programa}")
-            
-            # Medir el tiempo de procesamiento
-            inicio = time.time()
-            
-            # Procesar la solicitud con tiempo límite (evitar procesamiento infinito)
-            respuesta = self.servidor.asignar_aulas(solicitud)
-            
-            # Calcular tiempo de procesamiento
-            tiempo_proc = time.time() - inicio
-            
-            # Mostrar estadísticas
+        solicitud, error = decodificar_solicitud(mensaje)
+        if error:
+            logging.error(f"[{request_id}] {error}")
+            self._enviar_error(socket, sobre, error, request_id)
+            return
+        
+        facultad = solicitud['facultad']
+        programa = solicitud['programa']
+        
+        logging.info(f"[{request_id}] Procesando solicitud de {facultad} - {programa}")
+        print(f"\nSOLICITUD [{request_id}]: {facultad} - {programa}")
+        
+        # Medir el tiempo de procesamiento
+        inicio = time.monotonic_ns()
+        
+        # Procesar la solicitud con tiempo límite (evitar procesamiento infinito)
+        respuesta = self.servidor.asignar_aulas(solicitud)
+        
+        # Calcular tiempo de procesamiento
+        tiempo_proc = (time.monotonic_ns() - inicio) / 1e9
+        
+        # Mostrar estadísticas (solo en modo depuración: recorre todas las aulas)
+        if MODO_DEPURACION:
             estadisticas = self.servidor.obtener_estadisticas()
             print(f"ESTADISTICAS [{request_id}]: {facultad} - {programa}")
             print(json.dumps(estadisticas, indent=2))
+        
+        # Enviar respuesta al broker con el mismo sobre de enrutamiento
+        socket.send_multipart(sobre + [serializar(respuesta)])
+        
+        logging.info(f"[{request_id}] Respuesta enviada a {facultad} - {programa} (procesado en {tiempo_proc:.2f}s)")
+        print(f"RESPUESTA [{request_id}]: Enviada a {facultad} - {programa}")
+        
+        # Guardar el estado actualizado
+        self.guardar_estado_respaldo()
+        
+        # Enviar READY para indicar que estamos listos para una nueva solicitud
+        self._enviar_ready(socket)
+        logging.info("Solicitud procesada completamente. Enviado mensaje READY al broker.")
             
-            # Enviar respuesta al broker
-            socket.send_multipart([
-                b"",              # Empty frame
-                id_cliente,        # Client ID
-                b"",              # Empty delimiter
-                json.dumps(respuesta).encode("utf-8")  # Response
-            ])
-            
-            logging.info(f"[{request_id}] Respuesta enviada a {facultad} - {programa} (procesado en {tiempo_proc:.2f}s)")
-            print(f"RESPUESTA [{request_id}]: Enviada a {facultad} - {programa}")
-            
-            # Guardar el estado actualizado
-            self.guardar_estado_respaldo()
-            
-            # Enviar READY para indicar que estamos listos para una nueva solicitud
-            socket.send_multipart([b"READY"])
-            logging.info("Solicitud procesada completamente. Enviado mensaje READY al broker.")
-            
-        except json.JSONDecodeError:
-            logging.error(f"[{request_id}] Error al decodificar JSON de la solicitud")
-            self._enviar_error(socket, id_cliente, "Formato de solicitud inválido", request_id)
-        except KeyError as e:
-            logging.error(f"[{request_id}] Falta campo requerido en la solicitud: {e}")
-            self._enviar_error(socket, id_cliente, f"Falta campo requerido: {e}", request_id)
-        except Exception as e:
-            mensaje_error = f"Error procesando solicitud: {str(e)}"
-            logging.error(f"[{request_id}] {mensaje_error}")
-            self._enviar_error(socket, id_cliente, mensaje_error, request_id)
-            
-    def _enviar_error(self, socket, id_cliente, mensaje_error, request_id=''):
+    def _enviar_error(self, socket, sobre, mensaje_error, request_id=''):
         """Envía un mensaje de error al cliente y marca el worker como disponible."""
         try:
             # Enviar mensaje de error
-            socket.send_multipart([
-                b"",              # Empty frame
-                id_cliente,        # Client ID
-                b"",              # Empty delimiter
-                json.dumps({"error": mensaje_error}).encode("utf-8")
-            ])
+            socket.send_multipart(sobre + [serializar({"error": mensaje_error})])
             logging.info(f"[{request_id}] Mensaje de error enviado al cliente: {mensaje_error}")
             
             # Enviar READY para seguir recibiendo solicitudes
-            socket.send_multipart([b"READY"])
+            self._enviar_ready(socket)
             logging.info(f"[{request_id}] Error manejado. Enviado mensaje READY al broker.")
         except Exception as e:
             logging.error(f"[{request_id}] Error al enviar mensaje de error: {e}")
             # Último intento de enviar READY
             try:
-                socket.send_multipart([b"READY"])
-            except:
+                self._enviar_ready(socket)
+            except zmq.ZMQError:
                 logging.error(f"[{request_id}] No se pudo enviar READY después de error")
                 
+    def _enviar_ready(self, socket):
+        """
+        Avisa al broker personalizado que el worker está disponible. Con el
+        broker nativo (proxy ROUTER-DEALER) no hay registro y no se envía nada.
+        """
+        if BROKER_MODO_PLANIFICACION != "nativo":
+            socket.send_multipart([b"READY"])
+                
     def reportar_estado(self):
         """Genera un reporte del estado actual del servidor."""
         if not self.servidor_activo:
@@ -0,0 +1,73 @@
+"""
+catalogo_facultades.py - Lectura del catálogo de facultades y programas
+
+Único parser de FACULTADES_FILE, compartido por los programas académicos, los
+servidores de facultad y el broker. El resultado se cachea en el proceso
+mientras el archivo no cambie.
+
+Formato del archivo facultades.txt:
+    Facultad1, Programa1, Programa2, Programa3
+    Facultad2, Programa1, Programa2
+
+Uso básico:
+    from catalogo_facultades import cargar_facultades
+    facultades = cargar_facultades()  # {"Facultad1": ("Programa1", ...), ...}
+"""
+
+import os
+import types
+import functools
+from config import FACULTADES_FILE
+
+def cargar_facultades():
+    """
+    Carga las facultades y programas académicos desde el archivo de texto.
+    
+    El resultado se reutiliza mientras el archivo no cambie (misma fecha de
+    modificación en nanosegundos y mismo tamaño). Como todos los llamadores
+    comparten el mismo objeto, se entrega como vista de solo lectura.
+    
+    Returns:
+        Mapping: Facultades y sus programas académicos (tupla por facultad).
+    """
+    try:
+        estado = os.stat(FACULTADES_FILE)
+    except OSError:
+        print(f"\n❌ Error: No se encontró el archivo '{FACULTADES_FILE}'.")
+        return types.MappingProxyType({})
+    return _leer_facultades(FACULTADES_FILE, estado.st_mtime_ns, estado.st_size)
+
+@functools.lru_cache(maxsize=1)
+def _leer_facultades(ruta, modificado_ns, tamano):
+    """
+    Parsea el archivo de facultades (cacheado por ruta, fecha de modificación y tamaño).
+    
+    Args:
+        ruta (str): Ruta del archivo de facultades
+        modificado_ns (int): st_mtime_ns del archivo, solo como parte de la clave
+        tamano (int): st_size del archivo, solo como parte de la clave
+        
+    Returns:
+        Mapping: Vista de solo lectura de las facultades y sus programas académicos.
+    """
+    facultades = {}
+    try:
+        # Leer el archivo completo de una vez y partirlo como bytes; solo se
+        # decodifican los campos de las líneas válidas
+        with open(ruta, "rb") as file:
+            contenido = file.read()
+        for line in contenido.split(b"\n"):
+            line = line.strip()
+            if not line:
+                continue
+            data = line.split(b", ")
+            if len(data) < 2:
+                print(f"\n⚠️ Advertencia: Línea mal formada en '{ruta}': {line.decode('utf-8', 'replace')}")
+                continue
+            facultad = data[0].decode("utf-8")
+            programas = tuple(programa.decode("utf-8") for programa in data[1:])
+            facultades[facultad] = programas
+    except Exception as e:
+        print(f"\n❌ Error al leer el archivo '{ruta}': {e}")
+
+    return types.MappingProxyType(facultades)
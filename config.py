@@ -1,6 +1,16 @@
 # =============================================================================
 # Configuración del Sistema de Asignación de Aulas
 # =============================================================================
+import os
+
+# Salida detallada por solicitud en consola (SDF_DEBUG=1 para activarla)
+MODO_DEPURACION = os.environ.get("SDF_DEBUG", "0") == "1"
+
+# Formato de los mensajes entre componentes (SDF_SERIALIZACION):
+#   "json"    - JSON compacto en UTF-8 (orjson si está instalado)
+#   "msgpack" - binario, requiere el paquete msgpack en todos los nodos
+FORMATO_SERIALIZACION = os.environ.get("SDF_SERIALIZACION", "json")
+
 # Servidores de Facultad
 FACULTAD_1_URL = "tcp://127.0.0.1:5555"
 FACULTAD_2_URL = "tcp://127.0.0.1:5558"
@@ -8,12 +18,38 @@ FACULTAD_2_URL = "tcp://127.0.0.1:5558"
 # Lista de URLs de facultades
 FACULTAD_SERVERS = [FACULTAD_1_URL, FACULTAD_2_URL]
 
+# Máximo de sockets REQ reutilizables por servidor de facultad en la simulación
+SOCKETS_POR_FACULTAD_MAX = 10
+
+# Solicitudes en vuelo por servidor de facultad en el modo interactivo: la
+# siguiente solicitud va al servidor que tenga capacidad libre
+SOLICITUDES_EN_VUELO_POR_FACULTAD = 2
+
+# Solo para ciclos de prueba (SDF_CACHE_RESPUESTAS=1): el programa académico
+# reutiliza la respuesta ya recibida para una solicitud idéntica sin volver a
+# enviarla, así que el DTI no asigna aulas de nuevo. Desactivado por defecto
+CACHE_RESPUESTAS_PROGRAMA = os.environ.get("SDF_CACHE_RESPUESTAS", "0") == "1"
+RESPUESTAS_CACHEADAS_MAX = 256
+
 # Load Balancer Broker URLs
 BROKER_IP = "127.0.0.1"
 BROKER_FRONTEND_PORT = "5571"  # Port for clients (facultad)
 BROKER_BACKEND_PORT = "5572"   # Port for workers (DTI)
 BROKER_FRONTEND_URL = f"tcp://{BROKER_IP}:{BROKER_FRONTEND_PORT}"
 BROKER_BACKEND_URL = f"tcp://{BROKER_IP}:{BROKER_BACKEND_PORT}"
+BROKER_HWM = 10000             # High-water mark for broker sockets (burst absorption)
+BROKER_IO_THREADS = 2          # libzmq I/O threads (frontend and backend traffic in parallel)
+BROKER_MAX_CLIENTES = 1024     # Client entries kept by the broker (least recently used evicted)
+
+# Planificación del broker:
+#   "personalizado" - ROUTER-ROUTER, el broker elige el worker en Python (mensajes READY,
+#                     cola LRU: el worker libre desde hace más tiempo)
+#   "nativo"        - zmq.proxy ROUTER-DEALER en C, reparto round-robin sin Python por mensaje
+BROKER_MODO_PLANIFICACION = "personalizado"
+
+# Núcleo de CPU al que se fija el hilo de despacho del broker (solo Linux).
+# Útil únicamente con carga alta; None lo desactiva
+BROKER_PIN_CORE = None
 
 # Puertos para el sistema de tolerancia a fallos
 HEARTBEAT_PORT = "5573"  # Puerto para heartbeat
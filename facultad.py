@@ -18,48 +18,252 @@ Archivos necesarios:
 """
 
 import zmq      # Para comunicación entre procesos
-import json     # Para serialización de mensajes
 import sys      # Para argumentos de línea de comandos
 import uuid     # Para generar ID único de cliente
 import time     # Para pausas y timeouts
-from config import FACULTAD_1_URL, FACULTAD_2_URL, FACULTADES_FILE, BROKER_FRONTEND_URL
+import itertools  # Para las etiquetas de las solicitudes en vuelo
+import threading  # Para el hilo de registro de métricas
+import logging  # Para trazas de depuración fuera del camino crítico
+from config import FACULTAD_1_URL, FACULTAD_2_URL, BROKER_FRONTEND_URL
+from serializacion import serializar, deserializar
+from catalogo_facultades import cargar_facultades
 from monitor_metricas import obtener_monitor
 from monitor_metricas_programa import obtener_monitor_programa
 
-def leer_facultades():
+# Segundos que se espera la respuesta del broker a cada solicitud reenviada
+TIMEOUT_BROKER = 10.0
+
+# Campos obligatorios de una solicitud de programa académico y su tipo
+ESQUEMA_SOLICITUD = {
+    "facultad": str,
+    "programa": str,
+    "semestre": int,
+    "salones": int,
+    "laboratorios": int,
+}
+
+def _generar_validador(esquema, facultades_validas):
     """
-    Lee el archivo de facultades y crea un diccionario de facultades y sus programas.
+    Genera al arrancar una función de validación especializada para el
+    esquema y la tabla de facultades, en lugar de recorrer el esquema en cada
+    solicitud: acceso directo por subíndice a cada campo (un único manejador
+    de KeyError, y de TypeError para lo que no se puede indexar o buscar en
+    el conjunto), una comprobación isinstance por campo y la pertenencia de
+    la facultad contra el conjunto ligado como constante.
 
-    Formato del archivo facultades.txt:
-        Facultad1, Programa1, Programa2, Programa3
-        Facultad2, Programa1, Programa2
+    Args:
+        esquema (dict): Campo -> tipo esperado
+        facultades_validas (frozenset): Nombres de facultades aceptadas
 
     Returns:
-        dict: Diccionario con facultades como claves y lista de programas como valores
-        Ejemplo:
-        {
-            "Facultad de Ingeniería": ["Sistemas", "Civil", "Electrónica"],
-            "Facultad de Medicina": ["Medicina", "Enfermería"]
-        }
+        function: validar(solicitud) que retorna None si la solicitud es
+            válida, o una tupla (motivo, campo) con motivo
+            "solicitud_invalida", "facultad_invalida" o "formato_invalido"
     """
-    try:
-        with open(FACULTADES_FILE, "r", encoding="utf-8") as archivo:
-            facultades = {}
-            for linea in archivo:
-                partes = linea.strip().split(", ")
-                if len(partes) >= 2:
-                    facultades[partes[0]] = partes[1:]
-            return facultades
-    except Exception as e:
-        print(f"Error al leer facultades: {e}")
-        return {}
+    lineas = ["def validar(solicitud):", "    try:"]
+    for campo, tipo in esquema.items():
+        lineas.append(f"        if not isinstance(solicitud[{campo!r}], {tipo.__name__}):")
+        lineas.append(f"            return ('solicitud_invalida', {campo!r})")
+    lineas += [
+        "        if solicitud['facultad'] not in facultades_validas:",
+        "            return ('facultad_invalida', 'facultad')",
+        "    except KeyError as e:",
+        "        return ('solicitud_invalida', e.args[0])",
+        "    except TypeError:",
+        "        return ('formato_invalido', None)",
+        "    return None",
+    ]
+    espacio = {tipo.__name__: tipo for tipo in esquema.values()}
+    espacio["facultades_validas"] = facultades_validas
+    exec("\n".join(lineas), espacio)
+    return espacio["validar"]
+
+class ClienteBroker:
+    """
+    Conexión persistente hacia el broker con varias solicitudes en vuelo.
+
+    El socket DEALER solo lo usa el bucle principal del servidor (sin hilos
+    auxiliares). Cada solicitud reenviada viaja como [etiqueta, b"", solicitud]:
+    el broker y el DTI devuelven el sobre intacto, así que toda respuesta,
+    incluidos los errores del DTI al decodificar y la respuesta inválida que
+    sustituye el broker, vuelve con la etiqueta de su solicitud. Una respuesta
+    sin etiqueta conocida (tardía o sin sobre) se descarta; su solicitud vence
+    por su plazo en lugar de recibir una respuesta ajena.
+    """
+    
+    def __init__(self, contexto, client_id):
+        """
+        Crea el socket DEALER conectado al broker.
+        
+        Args:
+            contexto (zmq.Context): Contexto del servidor de facultad
+            client_id (bytes): ID único del cliente para identificación en el broker
+        """
+        self.socket = contexto.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.IDENTITY, client_id)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(BROKER_FRONTEND_URL)
+        
+        # Solicitudes en vuelo: etiqueta -> (sobre del programa, solicitud, inicio_ns, plazo).
+        # Todas tienen el mismo plazo relativo: la primera entrada es la próxima en vencer
+        self.pendientes = {}
+        self._etiquetas = itertools.count()
+    
+    def enviar(self, sobre, solicitud):
+        """
+        Reenvía una solicitud al broker sin esperar su respuesta.
+        
+        Args:
+            sobre (list): Sobre de enrutamiento del programa que la envió
+            solicitud (dict): Solicitud validada
+            
+        Returns:
+            bool: False si la cola hacia el broker está llena (contrapresión)
+        """
+        etiqueta = next(self._etiquetas).to_bytes(8, "big")
+        try:
+            self.socket.send_multipart([etiqueta, b"", serializar(solicitud)], flags=zmq.NOBLOCK)
+        except zmq.Again:
+            return False
+        self.pendientes[etiqueta] = (sobre, solicitud, time.monotonic_ns(),
+                                     time.monotonic() + TIMEOUT_BROKER)
+        return True
+    
+    def respuestas(self):
+        """
+        Recibe las respuestas ya disponibles del broker.
+        
+        Yields:
+            tuple: (pendiente, estado, respuesta) con estado "respuesta_exitosa"
+                o "respuesta_invalida"
+        """
+        while self.socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+            frames = self.socket.recv_multipart()
+            pendiente = self.pendientes.pop(frames[0], None) if len(frames) >= 3 else None
+            if pendiente is None:
+                logging.warning("Respuesta del broker sin solicitud en vuelo (tardía o sin etiqueta)")
+                continue
+            try:
+                respuesta = deserializar(frames[-1])
+            except ValueError:
+                respuesta = None
+            if isinstance(respuesta, dict):
+                yield pendiente, "respuesta_exitosa", respuesta
+            else:
+                yield pendiente, "respuesta_invalida", None
+    
+    def vencidas(self):
+        """
+        Retira las solicitudes cuyo plazo de respuesta ya venció.
+        
+        Yields:
+            tuple: pendiente (sobre, solicitud, inicio_ns, plazo)
+        """
+        ahora = time.monotonic()
+        pendientes = self.pendientes
+        while pendientes:
+            etiqueta, pendiente = next(iter(pendientes.items()))
+            if pendiente[3] > ahora:
+                break
+            del pendientes[etiqueta]
+            yield pendiente
+    
+    def espera_ms(self):
+        """Milisegundos hasta el próximo vencimiento (o 1 s sin solicitudes en vuelo)."""
+        if not self.pendientes:
+            return 1000
+        plazo = next(iter(self.pendientes.values()))[3]
+        return max(0, int((plazo - time.monotonic()) * 1000) + 1)
+    
+    def cerrar(self):
+        """Cierra el socket hacia el broker."""
+        self.socket.close()
+
+class CanalMetricas:
+    """
+    Registro de métricas sin bloquear el bucle de solicitudes.
+
+    El hilo principal publica cada registro por un socket PUSH sobre
+    inproc://metricas y un hilo consumidor con el socket PULL es quien llama
+    a los monitores (que toman locks y escriben archivos). Si el canal está
+    lleno el registro se descarta en lugar de frenar la solicitud.
+    """
+    
+    # Monitores a los que se puede dirigir un registro
+    MONITORES = {
+        "general": obtener_monitor,
+        "programa": obtener_monitor_programa,
+    }
+    
+    def __init__(self, contexto):
+        """
+        Crea el canal y arranca el hilo consumidor.
+        
+        Args:
+            contexto (zmq.Context): Contexto compartido (inproc exige el mismo contexto)
+        """
+        receptor = contexto.socket(zmq.PULL)
+        receptor.bind("inproc://metricas")
+        
+        self.emisor = contexto.socket(zmq.PUSH)
+        self.emisor.setsockopt(zmq.SNDHWM, 10000)
+        self.emisor.setsockopt(zmq.LINGER, 0)
+        self.emisor.connect("inproc://metricas")
+        
+        self.activo = True
+        self.hilo = threading.Thread(target=self._hilo_consumidor, args=(receptor,), daemon=True)
+        self.hilo.start()
+    
+    def registrar(self, monitor, metodo, *args):
+        """
+        Publica un registro de métricas sin esperar a que se procese.
+        
+        Args:
+            monitor (str): "general" o "programa"
+            metodo (str): Nombre del método registrar_* del monitor
+            *args: Argumentos del método
+        """
+        try:
+            self.emisor.send(serializar([monitor, metodo, args]), flags=zmq.NOBLOCK)
+        except zmq.Again:
+            # Canal lleno: se descarta el registro
+            pass
+    
+    def cerrar(self):
+        """Detiene el hilo consumidor y cierra el socket emisor."""
+        self.activo = False
+        self.hilo.join(timeout=1.0)
+        self.emisor.close()
+    
+    def _hilo_consumidor(self, receptor):
+        """Recibe los registros publicados y los aplica sobre los monitores."""
+        try:
+            while self.activo:
+                if not receptor.poll(100):
+                    continue
+                while True:
+                    try:
+                        mensaje = receptor.recv(flags=zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    try:
+                        monitor, metodo, args = deserializar(mensaje)
+                        getattr(self.MONITORES[monitor](), metodo)(*args)
+                    except Exception as e:
+                        logging.error(f"Error registrando métrica: {e}")
+        except zmq.ZMQError as e:
+            if e.errno != zmq.ETERM:
+                print(f"ERROR ZMQ: Hilo de métricas: {e}")
+        finally:
+            receptor.close()
 
-def enviar_a_broker(solicitud, client_id):
+def respuesta_para_programa(solicitud, estado, json_data, inicio_ns, canal_metricas):
     """
-    Envía una solicitud al broker y espera su respuesta.
+    Registra las métricas del intercambio con el broker y arma la respuesta
+    que recibe el programa académico.
 
     Args:
-        solicitud (dict): Diccionario con los datos de la solicitud
+        solicitud (dict): Solicitud reenviada (o que se intentó reenviar) al broker
             Ejemplo:
             {
                 "facultad": "Facultad de Ingeniería",
@@ -68,7 +272,11 @@ def enviar_a_broker(solicitud, client_id):
                 "laboratorios": 1,
                 "semestre": 1
             }
-        client_id (bytes): ID único del cliente para identificación
+        estado (str): "respuesta_exitosa", "respuesta_invalida",
+            "contrapresion_broker" o "timeout"
+        json_data (dict | None): Respuesta del DTI cuando estado es "respuesta_exitosa"
+        inicio_ns (int): time.monotonic_ns() al reenviar la solicitud
+        canal_metricas (CanalMetricas): Canal para registrar métricas fuera de la ruta crítica
 
     Returns:
         dict: Respuesta del servidor DTI o mensaje de error
@@ -82,110 +290,54 @@ def enviar_a_broker(solicitud, client_id):
                 "error": "Mensaje de error"
             }
     """
-    # Obtener monitor de métricas
-    monitor = obtener_monitor()
-    tiempo_inicio_comunicacion = time.time()
-    
-    contexto = zmq.Context()
-    socket = contexto.socket(zmq.DEALER)
+    # Registrar métricas de tiempo de respuesta del servidor (incluye broker + DTI)
+    tiempo_respuesta_total = (time.monotonic_ns() - inicio_ns) / 1e9
+    canal_metricas.registrar(
+        "general", "registrar_tiempo_respuesta_servidor",
+        tiempo_respuesta_total,
+        solicitud.get("facultad", "Desconocida"),
+        "error_zmq" if estado == "timeout" else estado
+    )
     
-    # Configurar identidad del cliente para el broker
-    socket.setsockopt(zmq.IDENTITY, client_id)
-    socket.connect(BROKER_FRONTEND_URL)
-    
-    # Configurar timeouts para evitar bloqueos
-    socket.setsockopt(zmq.RCVTIMEO, 10000)  # 10 segundos de timeout para recepción
-    socket.setsockopt(zmq.SNDTIMEO, 5000)   # 5 segundos de timeout para envío
-    
-    try:
-        # Añadir distancia a la solicitud para simular carga
-        solicitud['distance'] = sum(ord(c) for c in solicitud['facultad']) % 10 + 1
-        
-        # Enviar solicitud al broker
-        socket.send_multipart([b"", json.dumps(solicitud).encode('utf-8')])
-        
-        # Recibir respuesta del broker (con timeout)
-        response_frames = socket.recv_multipart()
-        print(f"Frames recibidos: {len(response_frames)} - Contenido: {[f[:20] + b'...' if len(f) > 20 else f for f in response_frames]}")
-        
-        # En el patrón DEALER, la respuesta debe tener al menos un frame vacío seguido 
-        # por el mensaje real (normalmente en la última posición)
-        
-        # Buscar el último frame no vacío que contenga datos JSON
-        json_data = None
-        for frame in reversed(response_frames):
-            if frame:  # Si no está vacío
-                try:
-                    json_data = json.loads(frame.decode('utf-8'))
-                    break
-                except json.JSONDecodeError:
-                    continue
-        
-        if json_data:
-            # Registrar métricas de tiempo de respuesta del servidor (incluye broker + DTI)
-            tiempo_respuesta_total = time.time() - tiempo_inicio_comunicacion
-            monitor.registrar_tiempo_respuesta_servidor(
-                tiempo_respuesta_total,
-                solicitud.get("facultad", "Desconocida"),
-                "respuesta_exitosa"
-            )
-            return json_data
-        else:
-            # Registrar métricas incluso para respuestas inválidas
-            tiempo_respuesta_total = time.time() - tiempo_inicio_comunicacion
-            monitor.registrar_tiempo_respuesta_servidor(
-                tiempo_respuesta_total,
-                solicitud.get("facultad", "Desconocida"),
-                "respuesta_invalida"
-            )
-            print(f"ADVERTENCIA: No se encontró un JSON válido en la respuesta")
-            return {"error": "No se pudo extraer datos JSON de la respuesta"}
-    except zmq.ZMQError as e:
-        # Registrar métricas de error de comunicación
-        tiempo_respuesta_total = time.time() - tiempo_inicio_comunicacion
-        monitor.registrar_tiempo_respuesta_servidor(
-            tiempo_respuesta_total,
-            solicitud.get("facultad", "Desconocida"),
-            "error_zmq"
-        )
-        
-        if e.errno == zmq.EAGAIN:
-            print(f"TIMEOUT: Esperando respuesta del broker: {e}")
-            return {"error": f"Timeout esperando respuesta del broker (posiblemente ocupado)"}
-        else:
-            print(f"ERROR ZMQ: Comunicación con el broker: {e}")
-            return {"error": f"Error de comunicación ZMQ con el broker: {e}"}
-    except Exception as e:
-        # Registrar métricas de error general
-        tiempo_respuesta_total = time.time() - tiempo_inicio_comunicacion
-        monitor.registrar_tiempo_respuesta_servidor(
-            tiempo_respuesta_total,
+    if estado == "respuesta_exitosa":
+        return json_data
+    elif estado == "contrapresion_broker":
+        # Registrar la solicitud descartada en las métricas por programa
+        canal_metricas.registrar(
+            "programa", "registrar_error_comunicacion_programa",
             solicitud.get("facultad", "Desconocida"),
-            "error_general"
+            solicitud.get("programa", "Desconocido"),
+            "contrapresion_broker"
         )
-        
-        print(f"ERROR: Inesperado al comunicarse con el broker: {e}")
-        return {"error": f"Error de comunicación con el broker: {e}"}
-    finally:
-        socket.close()
-        contexto.term()
+        print("ADVERTENCIA: Broker saturado, solicitud no enviada")
+        return {"error": "Broker saturado (contrapresión), intente nuevamente"}
+    elif estado == "timeout":
+        print("TIMEOUT: Esperando respuesta del broker")
+        return {"error": "Timeout esperando respuesta del broker (posiblemente ocupado)"}
+    else:
+        print(f"ADVERTENCIA: No se encontró un JSON válido en la respuesta")
+        return {"error": "No se pudo extraer datos JSON de la respuesta"}
 
-def iniciar_servidor(url_servidor):
+def iniciar_servidor(url_servidor, facultades=None):
     """
     Inicia el servidor de facultad y procesa solicitudes en un bucle infinito.
     Actúa como cliente en el patrón Load Balancing Broker.
 
     Args:
         url_servidor (str): URL donde escuchará el servidor (ej: "tcp://127.0.0.1:5555")
+        facultades (dict, opcional): Tabla de facultades ya cargada; si no se
+            indica, se lee de FACULTADES_FILE
 
     Flujo de operación:
         1. Carga la lista de facultades válidas
-        2. Configura el socket ZMQ en modo REP (reply)
+        2. Configura el socket ZMQ en modo ROUTER, que atiende a los programas
+           con el mismo sobre que un REP pero sin obligar a responder en orden
         3. Espera y procesa solicitudes en bucle:
             - Recibe solicitud JSON
             - Valida que la facultad exista
-            - Reenvía solicitud válida al broker
-            - Retorna respuesta al programa solicitante
+            - Reenvía solicitud válida al broker sin esperar su respuesta
+            - Retorna cada respuesta del broker a su programa al llegar, así
+              varias solicitudes están en vuelo a la vez
 
     Manejo de errores:
         - Validación de formato JSON
@@ -194,17 +346,28 @@ def iniciar_servidor(url_servidor):
         - Errores inesperados
     """
     # Cargar datos de facultades
-    facultades = leer_facultades()
+    if facultades is None:
+        facultades = cargar_facultades()
     if not facultades:
         print("ADVERTENCIA: No hay facultades configuradas")
     
+    # Solo se consulta la pertenencia: conjunto inmutable de nombres, ligado
+    # al validador generado para esta instancia
+    facultades_validas = frozenset(facultades)
+    validar_solicitud = _generar_validador(ESQUEMA_SOLICITUD, facultades_validas)
+    
     # Crear ID único para este cliente (facultad)
-    client_id = str(uuid.uuid4()).encode()
+    # Identidad binaria de 16 bytes (ZeroMQ reserva las que empiezan con el byte cero)
+    client_id = b"\x01" + uuid.uuid4().bytes[1:]
     instance_id = url_servidor.split(":")[-1]  # Extraer número de puerto para identificación
     
-    # Configurar socket
+    # Configurar sockets: ROUTER hacia los programas y cliente persistente hacia el broker
     contexto = zmq.Context()
-    socket = contexto.socket(zmq.REP)
+    socket = contexto.socket(zmq.ROUTER)
+    cliente_broker = ClienteBroker(contexto, client_id)
+    
+    # Métricas registradas por un hilo aparte (inproc PUSH/PULL)
+    canal_metricas = CanalMetricas(contexto)
     
     try:
         socket.bind(url_servidor)
@@ -218,7 +381,7 @@ def iniciar_servidor(url_servidor):
         print(f"| {'Servidor Facultad':<25} | {'INICIADO':<15} | {'Cliente #{}'.format(instance_id):<30} |")
         print(f"| {'URL Servidor':<25} | {'ACTIVO':<15} | {url_servidor:<30} |")
         print(f"| {'Conexión Broker':<25} | {'CONECTADO':<15} | {BROKER_FRONTEND_URL:<30} |")
-        print(f"| {'Cliente ID':<25} | {'ASIGNADO':<15} | {client_id.decode()[:30]:<30} |")
+        print(f"| {'Cliente ID':<25} | {'ASIGNADO':<15} | {client_id.hex()[:30]:<30} |")
         print("-"*80)
         print("| ESTADO: Esperando solicitudes de programas académicos")
         print("="*80)
@@ -226,65 +389,111 @@ def iniciar_servidor(url_servidor):
         # Variable para seguimiento de solicitudes
         solicitudes_procesadas = 0
         
-        # Bucle principal
+        poller = zmq.Poller()
+        poller.register(socket, zmq.POLLIN)
+        poller.register(cliente_broker.socket, zmq.POLLIN)
+        
+        # Bucle principal: esperar hasta que llegue un mensaje o venza la
+        # solicitud en vuelo más antigua
         while True:
             try:
-                # Recibir solicitud con timeout para poder procesar interrupciones
-                try:
-                    mensaje = socket.recv_string(flags=zmq.NOBLOCK)
-                    solicitud = json.loads(mensaje)
-                    solicitudes_procesadas += 1
-                    print(f"\nSolicitud #{solicitudes_procesadas} recibida: {solicitud}")
-                    
-                    # Validar facultad
-                    if solicitud.get("facultad") not in facultades:
-                        respuesta = {"error": "Facultad no válida"}
-                        print(f"ADVERTENCIA: Facultad inválida: {solicitud.get('facultad')}")
-                        
-                        # Registrar rechazo por facultad inválida
-                        monitor_programa = obtener_monitor_programa()
-                        monitor_programa.registrar_requerimiento_rechazado_por_facultad(
-                            solicitud.get("facultad", "Desconocida"), 
-                            solicitud.get("programa", "Desconocido"), 
-                            "facultad_invalida"
-                        )
-                    else:
-                        # Añadir identificador de la instancia de facultad
-                        solicitud["facultad_instance"] = instance_id
+                eventos = dict(poller.poll(cliente_broker.espera_ms()))
+                
+                # Solicitudes de los programas: [sobre..., solicitud]
+                if socket in eventos:
+                    while socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                        frames = socket.recv_multipart()
+                        sobre = frames[:-1]
+                        try:
+                            solicitud = deserializar(frames[-1])
+                            solicitudes_procesadas += 1
+                            logging.debug("Solicitud #%d recibida: %s", solicitudes_procesadas, solicitud)
+                            
+                            # Un payload bien formado que no es un objeto (lista,
+                            # texto, número) se rechaza antes de leer sus campos
+                            if not isinstance(solicitud, dict):
+                                print(f"ADVERTENCIA: Solicitud que no es un objeto: {type(solicitud).__name__}")
+                                canal_metricas.registrar(
+                                    "programa", "registrar_requerimiento_rechazado_por_facultad",
+                                    "Desconocida", "Desconocido", "formato_invalido"
+                                )
+                                socket.send_multipart(sobre + [serializar({"error": "Formato de solicitud inválido"})])
+                                continue
+                            
+                            # Campos usados varias veces durante el procesamiento
+                            facultad = solicitud.get("facultad")
+                            programa = solicitud.get("programa")
+                            
+                            # Validar estructura y facultad
+                            rechazo = validar_solicitud(solicitud)
+                            if rechazo is not None:
+                                motivo, campo_invalido = rechazo
+                                if motivo == "facultad_invalida":
+                                    respuesta = {"error": "Facultad no válida"}
+                                    print(f"ADVERTENCIA: Facultad inválida: {facultad}")
+                                elif motivo == "formato_invalido":
+                                    respuesta = {"error": "Formato de solicitud inválido"}
+                                    print("ADVERTENCIA: Solicitud con formato inválido")
+                                else:
+                                    respuesta = {"error": f"Campo inválido o ausente: {campo_invalido}"}
+                                    print(f"ADVERTENCIA: Solicitud con campo inválido: {campo_invalido}")
+                                
+                                # Registrar rechazo de la facultad con su motivo
+                                canal_metricas.registrar(
+                                    "programa", "registrar_requerimiento_rechazado_por_facultad",
+                                    facultad if "facultad" in solicitud else "Desconocida", 
+                                    programa if "programa" in solicitud else "Desconocido", 
+                                    motivo
+                                )
+                            else:
+                                # Añadir identificador de la instancia de facultad y
+                                # distancia a la solicitud para simular carga
+                                solicitud["facultad_instance"] = instance_id
+                                solicitud["distance"] = sum(ord(c) for c in facultad) % 10 + 1
+                                
+                                # Reenviar al broker; la respuesta llega por su socket
+                                logging.debug("Enviando solicitud al broker: %s - %s", facultad, programa)
+                                inicio_ns = time.monotonic_ns()
+                                if cliente_broker.enviar(sobre, solicitud):
+                                    continue
+                                respuesta = respuesta_para_programa(
+                                    solicitud, "contrapresion_broker", None, inicio_ns, canal_metricas
+                                )
+                        except ValueError as e:
+                            # deserializar lanza ValueError con JSON y con msgpack
+                            print(f"ERROR: Formato de solicitud inválido: {e}")
+                            respuesta = {"error": "Formato de solicitud inválido"}
+                        except Exception as e:
+                            print(f"ERROR: Inesperado: {e}")
+                            respuesta = {"error": f"Error: {str(e)}"}
                         
-                        # Reenviar al broker
-                        print(f"ENVIANDO: Solicitud al broker: {solicitud.get('facultad')} - {solicitud.get('programa')}")
-                        respuesta = enviar_a_broker(solicitud, client_id)
-                        print(f"RECIBIDO: Respuesta del broker para: {solicitud.get('facultad')} - {solicitud.get('programa')}")
-                    
-                    # Enviar respuesta
-                    socket.send_string(json.dumps(respuesta))
-                    print(f"Respuesta enviada a programa: {respuesta}")
-                except zmq.Again:
-                    # No hay mensajes, esperar un poco y continuar
-                    time.sleep(0.01)
-                    continue
+                        # Enviar respuesta
+                        socket.send_multipart(sobre + [serializar(respuesta)])
+                        logging.debug("Respuesta enviada a programa: %s", respuesta)
+                
+                # Respuestas del broker, cada una a su programa
+                if cliente_broker.socket in eventos:
+                    for (sobre, solicitud, inicio_ns, _), estado, json_data in cliente_broker.respuestas():
+                        respuesta = respuesta_para_programa(solicitud, estado, json_data, inicio_ns, canal_metricas)
+                        socket.send_multipart(sobre + [serializar(respuesta)])
+                        logging.debug("Respuesta del broker para: %s - %s",
+                                      solicitud.get("facultad"), solicitud.get("programa"))
+                
+                # Solicitudes sin respuesta del broker dentro de TIMEOUT_BROKER
+                for sobre, solicitud, inicio_ns, _ in cliente_broker.vencidas():
+                    respuesta = respuesta_para_programa(solicitud, "timeout", None, inicio_ns, canal_metricas)
+                    socket.send_multipart(sobre + [serializar(respuesta)])
                 
-            except json.JSONDecodeError as e:
-                print(f"ERROR: Formato JSON inválido: {e}")
-                socket.send_string(json.dumps({"error": "Formato de solicitud inválido"}))
             except zmq.ZMQError as e:
                 print(f"ERROR ZMQ: {e}")
-                if e.errno != zmq.ETERM:  # No es error de terminación
-                    try:
-                        socket.send_string(json.dumps({"error": f"Error de comunicación: {str(e)}"}))
-                    except:
-                        pass
-            except Exception as e:
-                print(f"ERROR: Inesperado: {e}")
-                try:
-                    socket.send_string(json.dumps({"error": f"Error: {str(e)}"}))
-                except:
-                    pass
+                if e.errno == zmq.ETERM:  # Contexto terminado
+                    break
                 
     except Exception as e:
         print(f"ERROR FATAL: {e}")
     finally:
+        cliente_broker.cerrar()
+        canal_metricas.cerrar()
         socket.close()
         contexto.term()
 
@@ -304,6 +513,14 @@ if __name__ == "__main__":
         print("Uso: python facultad.py <1|2>")
         sys.exit(1)
     
+    # Las trazas por solicitud son de nivel DEBUG y quedan desactivadas por defecto
+    logging.basicConfig(
+        filename=f"facultad_{sys.argv[1]}.log",
+        level=logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    
     # Seleccionar URL según el número de servidor
     url = FACULTAD_1_URL if sys.argv[1] == "1" else FACULTAD_2_URL
     
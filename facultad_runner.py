@@ -0,0 +1,57 @@
+"""
+facultad_runner.py - Lanzador conjunto de los dos servidores de facultad
+
+Lee una sola vez la tabla de facultades y arranca los dos servidores de
+facultad como procesos hijos creados con fork. Los hijos heredan la tabla ya
+cargada (memoria compartida copy-on-write), en lugar de que cada proceso
+vuelva a leer y parsear facultades.txt.
+
+Cada hijo crea su propio contexto ZMQ y su propio cliente del broker después
+del fork, ya que un contexto ZMQ no puede compartirse entre procesos.
+
+Uso básico:
+    python facultad_runner.py  # Inicia las facultades 1 y 2
+"""
+
+import logging
+import multiprocessing as mp
+from config import FACULTAD_1_URL, FACULTAD_2_URL
+from catalogo_facultades import cargar_facultades
+from facultad import iniciar_servidor
+
+
+def main():
+    """Carga las facultades y lanza un proceso hijo por cada servidor de facultad."""
+    logging.basicConfig(
+        filename="facultad_runner.log",
+        level=logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    
+    # Tabla de solo lectura compartida con los hijos vía fork
+    facultades = cargar_facultades()
+    if not facultades:
+        print("ADVERTENCIA: No hay facultades configuradas")
+    
+    mp.set_start_method("fork")
+    procesos = [
+        mp.Process(target=iniciar_servidor, args=(url, facultades), name=f"facultad-{n}")
+        for n, url in enumerate((FACULTAD_1_URL, FACULTAD_2_URL), start=1)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    
+    try:
+        for proceso in procesos:
+            proceso.join()
+    except KeyboardInterrupt:
+        print("\nDeteniendo servidores de facultad...")
+        for proceso in procesos:
+            proceso.terminate()
+        for proceso in procesos:
+            proceso.join()
+
+
+if __name__ == "__main__":
+    main()
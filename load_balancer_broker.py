@@ -4,7 +4,7 @@ Based on the ZeroMQ Load Balancing Broker Pattern
 
 This module implements a broker that:
 1. Connects clients (facultad instances) with workers (DTI_servidor instances)
-2. Distributes work using a load balancing algorithm based on distance
+2. Distributes work to the worker that has been idle the longest (LRU queue)
 3. Tracks and displays the count of remaining client requests
 4. Manages worker availability 
 
@@ -16,44 +16,148 @@ The broker uses a ROUTER-ROUTER pattern with two separate sockets:
 import zmq
 import threading
 import time
-import json
 import logging
+import logging.handlers
+import queue
 from datetime import datetime
-from config import BROKER_FRONTEND_URL, BROKER_BACKEND_URL
+from collections import OrderedDict, deque
+from config import BROKER_FRONTEND_URL, BROKER_BACKEND_URL, BROKER_HWM, BROKER_MAX_CLIENTES, BROKER_MODO_PLANIFICACION
+from config import BROKER_PIN_CORE, BROKER_IO_THREADS, FORMATO_SERIALIZACION
+import os
 import sys
 from monitor_metricas import obtener_monitor
+from serializacion import serializar, deserializar
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Seconds between status line refreshes
+MONITOR_INTERVAL = 2
+
+# Seconds between periodic servidor-facultad metric reports
+REPORT_INTERVAL = 300
+
+# Max messages drained from one socket per wake-up (keeps both sides fair)
+DRAIN_BATCH = 256
+
+# Seconds after which a captured request with no response is forgotten
+# (the facultad itself gives up after 10 s)
+CAPTURE_REQUEST_EXPIRY = 30
+
+# Empty delimiter frame, shared instead of allocating b'' per message
+_EMPTY = b''
+
+# Pre-encoded reply sent in place of a worker response that is not a JSON object
+_INVALID_RESPONSE = serializar({"error": "Respuesta inválida del servidor"})
+
+def _tune_socket(sock):
+    """Apply the broker's socket options: HWM, no linger, TCP keepalive, handover"""
+    sock.set_hwm(BROKER_HWM)  # Absorb request bursts
+    sock.setsockopt(zmq.LINGER, 0)
+    sock.setsockopt(zmq.TCP_KEEPALIVE, 1)
+    if sock.socket_type == zmq.ROUTER:
+        # A peer reconnecting with the same identity takes over its old slot
+        sock.setsockopt(zmq.ROUTER_HANDOVER, 1)
+
+def _pin_dispatch_thread():
+    """Pin the calling thread to BROKER_PIN_CORE and raise its priority (Linux only)"""
+    if BROKER_PIN_CORE is None or not sys.platform.startswith("linux"):
+        return
+    # On Linux both calls apply to the calling thread; threads started before
+    # it (log listener, capture monitor) keep the full CPU mask
+    try:
+        os.sched_setaffinity(0, {BROKER_PIN_CORE})
+    except OSError as e:
+        logging.warning(f"No se pudo fijar el hilo de despacho al núcleo {BROKER_PIN_CORE}: {e}")
+    try:
+        os.nice(-5)
+    except PermissionError:
+        logging.warning("Subir la prioridad del hilo de despacho requiere CAP_SYS_NICE")
+
+def _parse_json_object(data):
+    """Decode an object frame (wire format of serializacion); None if invalid or not an object"""
+    try:
+        parsed = deserializar(data)
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+if msgspec is not None:
+    class _RequestTag(msgspec.Struct):
+        """Only the request fields the broker reads; the rest are skipped unparsed"""
+        facultad: object = None
+        programa: object = None
+    
+    # Same wire format as serializacion
+    _tag_format = msgspec.msgpack if FORMATO_SERIALIZACION == "msgpack" else msgspec.json
+    _decode_tag = _tag_format.Decoder(_RequestTag).decode
+    
+    def _request_tag(data):
+        """Read (facultad, programa) from a request frame; None for missing fields"""
+        try:
+            tag = _decode_tag(data)
+        except msgspec.DecodeError:
+            return None, None
+        return tag.facultad, tag.programa
+else:
+    def _request_tag(data):
+        """Read (facultad, programa) from a request frame; None for missing fields"""
+        parsed = _parse_json_object(data)
+        if parsed is None:
+            return None, None
+        return parsed.get("facultad"), parsed.get("programa")
 
 class LoadBalancerBroker:
     def __init__(self):
         """Initialize the load balancing broker"""
-        self.context = zmq.Context()
+        # "nativo": libzmq forwards the data plane (ROUTER-DEALER proxy in C)
+        # "personalizado": Python loop with explicit worker selection (ROUTER-ROUTER)
+        self.native_mode = BROKER_MODO_PLANIFICACION == "nativo"
+        
+        self.context = zmq.Context(io_threads=BROKER_IO_THREADS)
         # Socket facing clients (facultad)
         self.frontend = self.context.socket(zmq.ROUTER)
+        _tune_socket(self.frontend)
         self.frontend.bind(BROKER_FRONTEND_URL)
         
         # Socket facing workers (DTI_servidor)
-        self.backend = self.context.socket(zmq.ROUTER)
+        self.backend = self.context.socket(zmq.DEALER if self.native_mode else zmq.ROUTER)
+        _tune_socket(self.backend)
+        if not self.native_mode:
+            # Raise on unroutable or full worker pipes instead of dropping silently
+            self.backend.setsockopt(zmq.ROUTER_MANDATORY, 1)
         self.backend.bind(BROKER_BACKEND_URL)
         
-        # Queue of available workers
-        self.available_workers = []
+        # Client requests no worker could take yet (frames, in arrival order)
+        self.pending_requests = deque()
         
-        # Track active workers
-        self.workers = set()
+        # Idle workers in the order they became ready (LRU queue): O(1)
+        # membership checks, removal and pop of the longest-idle worker
+        self.available_workers = OrderedDict()
         
-        # Track client requests and their distances
-        self.clients = {}
+        # Track active workers: worker address -> short readable ID for logs
+        self.workers = {}
+        
+        # Track client requests (LRU order, bounded by BROKER_MAX_CLIENTES)
+        self.clients = OrderedDict()
         self.client_requests_count = 0
         
         # Monitor de métricas
         self.monitor_metricas = obtener_monitor()
         
-        # Diccionario para rastrear tiempos de solicitudes en el broker
+        # Diccionario para rastrear tiempos de solicitudes en el broker (time.monotonic_ns):
+        # (cliente, worker) en modo personalizado, sobre de enrutamiento en modo nativo
         self.solicitudes_en_proceso = {}
         
         # Contador de solicitudes procesadas para métricas
         self.total_solicitudes_procesadas_broker = 0
         
+        # Protege los contadores de solicitudes: en modo nativo los actualiza
+        # el hilo de captura mientras el bucle principal los lee
+        self.stats_lock = threading.Lock()
+        
         # Set up logging
         self.setup_logging()
         
@@ -61,12 +165,19 @@ class LoadBalancerBroker:
     
     def setup_logging(self):
         """Configure logging for the broker"""
+        # The dispatch thread only enqueues records; a listener thread started
+        # in start() formats them and writes broker.log
+        file_handler = logging.FileHandler("broker.log")
+        file_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        ))
+        log_queue = queue.Queue(-1)
         logging.basicConfig(
-            filename="broker.log",
             level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
+            handlers=[logging.handlers.QueueHandler(log_queue)]
         )
+        self.log_listener = logging.handlers.QueueListener(log_queue, file_handler)
         
     def start(self):
         """Start the broker's main loop"""
@@ -76,7 +187,8 @@ class LoadBalancerBroker:
         print("="*80)
         print(f"| {'COMPONENTE':<25} | {'ESTADO':<15} | {'DETALLES':<30} |")
         print("-"*80)
-        print(f"| {'Load Balancer Broker':<25} | {'INICIADO':<15} | {'Patrón Router-Router':<30} |")
+        patron = "Proxy Router-Dealer (C)" if self.native_mode else "Patrón Router-Router"
+        print(f"| {'Load Balancer Broker':<25} | {'INICIADO':<15} | {patron:<30} |")
         print(f"| {'Frontend Socket':<25} | {'ESCUCHANDO':<15} | {BROKER_FRONTEND_URL:<30} |")
         print(f"| {'Backend Socket':<25} | {'ESCUCHANDO':<15} | {BROKER_BACKEND_URL:<30} |")
         print("-"*80)
@@ -87,17 +199,23 @@ class LoadBalancerBroker:
         print("| 'metricas' - Genera reporte de métricas inmediato")
         print("="*80)
         
-        # Start the monitoring thread
-        self.monitor_thread = threading.Thread(target=self.monitor_function, daemon=True)
-        self.monitor_thread.start()
+        # Start writing queued log records to broker.log
+        self.log_listener.start()
         
-        # Start the metrics reporting thread
-        self.metrics_thread = threading.Thread(target=self.generar_reportes_periodicos, daemon=True)
-        self.metrics_thread.start()
+        # Status line and periodic reports are driven by the main loop's timers
+        now = time.monotonic()
+        self.last_status = None
+        self.next_status = now
+        self.next_report = now + REPORT_INTERVAL
         
-        # Input thread for commands
-        self.input_thread = threading.Thread(target=self.command_input, daemon=True)
-        self.input_thread.start()
+        # Commands are read by the main loop (stdin registered in its poller).
+        # Where stdin cannot be polled (Windows) a thread reads it and hands
+        # each line over through a queue
+        self.command_queue = None
+        if os.name == "nt":
+            self.command_queue = queue.Queue()
+            self.input_thread = threading.Thread(target=self.command_input, daemon=True)
+            self.input_thread.start()
         
         try:
             self.broker_loop()
@@ -109,87 +227,260 @@ class LoadBalancerBroker:
             self.cleanup()
     
     def command_input(self):
-        """Handle command input in a separate thread"""
+        """Read commands in a separate thread (only where stdin cannot be polled)"""
         while self.running:
-            cmd = input().strip().lower()
-            if cmd == "salir":
-                self.running = False
-                break
-            elif cmd =="limpiar" or cmd == "clean":
-                duplicates = self.cleanup_worker_list()
-                print(f"\nLIMPIEZA: Lista de workers limpiada - Eliminados {duplicates} duplicados")
-                print(f"INFO: Workers disponibles: {len(self.available_workers)}/{len(self.workers)}")
-            elif cmd == "status" or cmd == "estado":
-                print(f"\n" + "-"*50)
-                print(f"ESTADO DEL BROKER:")
-                print(f"- Workers registrados: {len(self.workers)}")
-                print(f"- Workers disponibles: {len(self.available_workers)}")
-                print(f"- Clientes conectados: {len(self.clients)}")
-                print(f"- Solicitudes pendientes: {self.client_requests_count}")
-                print("-"*50)
-            elif cmd == "metricas" or cmd == "metrics":
-                try:
-                    reporte = self.monitor_metricas.generar_reporte_servidor_facultad(self.total_solicitudes_procesadas_broker)
+            self.command_queue.put(input())
+    
+    def register_stdin(self, poller):
+        """Add stdin to a poller so commands are handled by the polling thread"""
+        if self.command_queue is None:
+            poller.register(sys.stdin.fileno(), zmq.POLLIN)
+    
+    def process_commands(self, poller, socks):
+        """Run the commands typed since the last poll, serially with dispatch"""
+        if self.command_queue is not None:
+            while not self.command_queue.empty():
+                self.handle_command(self.command_queue.get_nowait())
+        elif sys.stdin.fileno() in socks:
+            line = sys.stdin.readline()
+            if not line:
+                # EOF: stop polling a closed stdin
+                poller.unregister(sys.stdin.fileno())
+                return
+            self.handle_command(line)
+    
+    def handle_command(self, line):
+        """Execute one console command"""
+        cmd = line.strip().lower()
+        if cmd == "salir":
+            self.running = False
+        elif cmd =="limpiar" or cmd == "clean":
+            duplicates = self.cleanup_worker_list()
+            print(f"\nLIMPIEZA: Lista de workers limpiada - Eliminados {duplicates} duplicados")
+            print(f"INFO: Workers disponibles: {len(self.available_workers)}/{len(self.workers)}")
+        elif cmd == "status" or cmd == "estado":
+            print(f"\n" + "-"*50)
+            print(f"ESTADO DEL BROKER:")
+            print(f"- Workers registrados: {len(self.workers)}")
+            print(f"- Workers disponibles: {len(self.available_workers)}")
+            print(f"- Clientes conectados: {len(self.clients)}")
+            with self.stats_lock:
+                pendientes = self.client_requests_count
+            print(f"- Solicitudes pendientes: {pendientes}")
+            print("-"*50)
+        elif cmd == "metricas" or cmd == "metrics":
+            try:
+                with self.stats_lock:
+                    total = self.total_solicitudes_procesadas_broker
+                reporte = self.monitor_metricas.generar_reporte_servidor_facultad(total)
+                if reporte.get('sin_cambios'):
+                    print(f"\nREPORTE: SERVIDOR-FACULTAD sin cambios desde el anterior, no se escribe: {reporte['timestamp']}")
+                else:
                     print(f"\nREPORTE: SERVIDOR-FACULTAD generado: {reporte['timestamp']}")
-                    print(f"TOTAL: Solicitudes procesadas: {reporte['total_solicitudes_procesadas']}")
-                    print(f"METRICAS: Servidor-facultad: {reporte['metricas_servidor_facultad']['total_mediciones']}")
-                except Exception as e:
-                    print(f"ERROR: Generando reporte: {e}")
-                
+                print(f"TOTAL: Solicitudes procesadas: {reporte['total_solicitudes_procesadas']}")
+                print(f"METRICAS: Servidor-facultad: {reporte['metricas_servidor_facultad']['total_mediciones']}")
+            except Exception as e:
+                print(f"ERROR: Generando reporte: {e}")
+    
     def broker_loop(self):
         """Main broker loop using zmq polling"""
-        # Initialize poll set
+        if self.native_mode:
+            self.proxy_loop()
+            return
+        
+        _pin_dispatch_thread()
+        
+        # Initialize poll set; the frontend joins it only while a client
+        # request can be dispatched (see below)
         poller = zmq.Poller()
-        poller.register(self.frontend, zmq.POLLIN)
         poller.register(self.backend, zmq.POLLIN)
-        
-        # Variables para control de tiempo
-        last_cleanup = time.time()
-        cleanup_interval = 5  # Segundos entre limpiezas
+        self.register_stdin(poller)
+        polling_frontend = False
         
         while self.running:
             try:
-                socks = dict(poller.poll(100))  # 100ms timeout for checking self.running
+                # POLLIN is level-triggered: with queued client requests and no
+                # idle worker (or held-back requests) a registered frontend would
+                # wake the poller on every pass. Poll it only while a request can
+                # go out, as in the classic LRU broker
+                accept_clients = bool(self.available_workers) and not self.pending_requests
+                if accept_clients != polling_frontend:
+                    if accept_clients:
+                        poller.register(self.frontend, zmq.POLLIN)
+                    else:
+                        poller.unregister(self.frontend)
+                    polling_frontend = accept_clients
                 
-                # Limpiar periódicamente la lista de workers
-                if time.time() - last_cleanup > cleanup_interval:
-                    self.cleanup_worker_list()
-                    last_cleanup = time.time()
+                socks = dict(poller.poll(self.poll_timeout()))
                 
-                # Handle worker messages
+                # Console commands and timers run here, between dispatch batches
+                self.process_commands(poller, socks)
+                self.run_timers()
+                
+                # Handle worker messages: drain up to DRAIN_BATCH queued since the last wake
                 if self.backend in socks and socks[self.backend] == zmq.POLLIN:
-                    self.handle_worker_message()
+                    for _ in range(DRAIN_BATCH):
+                        try:
+                            frames = self.backend.recv_multipart(zmq.NOBLOCK, copy=False)
+                        except zmq.Again:
+                            break
+                        self.handle_worker_message(frames)
                     
-                # Handle client messages if workers are available
-                if self.frontend in socks and socks[self.frontend] == zmq.POLLIN and self.available_workers:
-                    self.handle_client_message()
-            except Exception as e:
-                logging.error(f"Error en loop principal: {e}")
+                # Requests held back by backpressure go out before new ones
+                if self.pending_requests:
+                    self.flush_pending_requests()
+                
+                # Handle client messages while workers are available
+                if self.frontend in socks and socks[self.frontend] == zmq.POLLIN:
+                    for _ in range(DRAIN_BATCH):
+                        if not self.available_workers or self.pending_requests:
+                            break
+                        try:
+                            frames = self.frontend.recv_multipart(zmq.NOBLOCK, copy=False)
+                        except zmq.Again:
+                            break
+                        self.handle_client_message(frames)
+            except Exception:
+                # Exception (not BaseException): KeyboardInterrupt still reaches start()
+                logging.exception("Error en loop principal")
     
-    def handle_worker_message(self):
-        """Process messages from workers"""
+    def proxy_loop(self):
+        """Run the data plane inside libzmq and wait until the broker is stopped"""
+        # Every forwarded message is also published on the capture socket so
+        # stats and metrics are collected off the data path
+        capture = self.context.socket(zmq.PUB)
+        capture.set_hwm(BROKER_HWM)
+        capture.bind("inproc://broker_captura")
+        
+        # Control pair for the steerable proxy: lets 'salir' stop it cleanly
+        control = self.context.socket(zmq.PAIR)
+        control.bind("inproc://broker_control")
+        steering = self.context.socket(zmq.PAIR)
+        steering.connect("inproc://broker_control")
+        
+        capture_thread = threading.Thread(target=self.capture_monitor, daemon=True)
+        capture_thread.start()
+        
+        proxy_thread = threading.Thread(target=self.run_proxy, args=(capture, control), daemon=True)
+        proxy_thread.start()
+        
+        # Only console commands are handled here; the proxy owns the data plane
+        poller = zmq.Poller()
+        self.register_stdin(poller)
+        while self.running and proxy_thread.is_alive():
+            self.process_commands(poller, dict(poller.poll(self.poll_timeout())))
+            self.run_timers()
+        
+        if proxy_thread.is_alive():
+            steering.send(b"TERMINATE")
+            proxy_thread.join()
+        steering.close(linger=0)
+    
+    def run_proxy(self, capture, control):
+        """Forward frontend <-> backend with zmq.proxy_steerable until told to terminate"""
+        _pin_dispatch_thread()
+        try:
+            zmq.proxy_steerable(self.frontend, self.backend, capture, control)
+        except zmq.ZMQError as e:
+            if e.errno != zmq.ETERM:
+                logging.error(f"Error en el proxy del broker: {e}")
+        finally:
+            # The sockets belong to this thread once the proxy is running
+            self.frontend.close(linger=0)
+            self.backend.close(linger=0)
+            capture.close(linger=0)
+            control.close(linger=0)
+    
+    def capture_monitor(self):
+        """Update broker stats and metrics from the proxy's capture stream"""
+        subscriber = self.context.socket(zmq.SUB)
+        subscriber.setsockopt(zmq.SUBSCRIBE, b"")
+        subscriber.connect("inproc://broker_captura")
+        
+        try:
+            while True:
+                # Captured frames: [client_address, tag, b"", payload] in both
+                # directions (the facultad tags every request). The capture
+                # stream does not say which side a message came from, but the
+                # proxy captures a request before forwarding it, so an envelope
+                # not yet in flight is a request (frontend -> backend) and one
+                # in flight is the worker's response (backend -> frontend)
+                frames = subscriber.recv_multipart()
+                if len(frames) < 4:
+                    # No per-request tag: the envelope would be shared by
+                    # consecutive requests, so the message is not timed
+                    continue
+                sobre = tuple(frames[:-1])
+                ahora = time.monotonic_ns()
+                
+                # Forget requests that never got a response (worker died,
+                # client gave up); entries are in arrival order, so the
+                # expired ones are at the head
+                en_proceso = self.solicitudes_en_proceso
+                limite = ahora - CAPTURE_REQUEST_EXPIRY * 1_000_000_000
+                expiradas = 0
+                while en_proceso:
+                    clave, inicio = next(iter(en_proceso.items()))
+                    if inicio > limite:
+                        break
+                    del en_proceso[clave]
+                    expiradas += 1
+                
+                tiempo_inicio = en_proceso.pop(sobre, None)
+                
+                if tiempo_inicio is None:
+                    # Client request on its way to a worker
+                    en_proceso[sobre] = ahora
+                    with self.stats_lock:
+                        self.client_requests_count += 1 - expiradas
+                        self.total_solicitudes_procesadas_broker += 1
+                    if logging.getLogger().isEnabledFor(logging.INFO):
+                        faculty, program = _request_tag(frames[-1])
+                        logging.info(f"Solicitud recibida de: {faculty or 'unknown'} - {program or 'unknown'}")
+                else:
+                    # Worker response on its way back to the client
+                    with self.stats_lock:
+                        self.client_requests_count -= 1 + expiradas
+                    data = _parse_json_object(frames[-1])
+                    if data is not None:
+                        if "error" in data:
+                            tipo_operacion = "error_broker"
+                        elif "noDisponible" in data:
+                            tipo_operacion = "no_disponible_broker"
+                        else:
+                            tipo_operacion = "asignacion_exitosa_broker"
+                        self.monitor_metricas.registrar_tiempo_respuesta_servidor(
+                            (ahora - tiempo_inicio) / 1e9,
+                            data.get("facultad", "Desconocida"),
+                            tipo_operacion
+                        )
+        except zmq.ZMQError as e:
+            if e.errno != zmq.ETERM:
+                logging.error(f"Error en el monitor de captura: {e}")
+        finally:
+            subscriber.close(linger=0)
+    
+    def handle_worker_message(self, frames):
+        """Process a message received from a worker"""
         # Worker address frames come first
-        frames = self.backend.recv_multipart()
         
         # At least 3 frames expected: worker address, empty delimiter, client address
         # Check if this is a new worker registration
-        if len(frames) >= 2 and frames[-1] == b'READY':
-            worker_address = frames[0]
-            
-            # Verificar si este worker ya está registrado
-            is_new_worker = worker_address not in self.workers
-            
-            # Obtener una representación legible del ID del worker
-            worker_id_str = worker_address.decode('utf-8', 'ignore')
-            worker_id_short = worker_id_str[:8] + "..." if len(worker_id_str) > 8 else worker_id_str
+        # Frames are zmq.Frame objects (received with copy=False); only the
+        # addresses and the payload are materialized as bytes
+        payload = frames[-1].bytes
+        if len(frames) >= 2 and payload == b'READY':
+            worker_address = frames[0].bytes
             
             # Añadir a la cola de workers disponibles solo si aún no está
-            if worker_address not in self.available_workers:
-                self.available_workers.append(worker_address)
-                
-            # Registrar el worker solo si es nuevo
-            if is_new_worker:
-                self.workers.add(worker_address)
+            self.mark_available(worker_address)
+            
+            # Registrar el worker solo si es nuevo; el ID legible se calcula una vez
+            worker_id_short = self.workers.get(worker_address)
+            if worker_id_short is None:
+                worker_id_str = worker_address.hex()
+                worker_id_short = worker_id_str[:8] + "..." if len(worker_id_str) > 8 else worker_id_str
+                self.workers[worker_address] = worker_id_short
                 logging.info(f"Nuevo trabajador registrado: {worker_id_short}")
                 print(f"\nNUEVO WORKER: Trabajador registrado: {worker_id_short}")
             else:
@@ -197,26 +488,28 @@ class LoadBalancerBroker:
             return
             
         # Existing worker sending a response
-        worker_address = frames[0]
-        empty = frames[1]         # Empty delimiter frame
-        client_address = frames[2]
-        
-        # Rest of the frames are the actual response
-        rest_frames = frames[3:]
+        # Frames: [worker_address, '', client_address, ..., response]
+        worker_address = frames[0].bytes
+        client_address = frames[2].bytes
+        has_payload = len(frames) > 3
         
         # Add the worker back to the available worker queue sólo si no está ya en la lista
-        if worker_address not in self.available_workers:
-            self.available_workers.append(worker_address)
+        self.mark_available(worker_address)
+        
+        # Decode the response once for metrics, logging and validation
+        response_data = _parse_json_object(payload) if has_payload else None
         
         # Registrar métricas de tiempo de respuesta del broker
-        solicitud_key = (client_address, worker_address)
-        if solicitud_key in self.solicitudes_en_proceso:
-            tiempo_inicio = self.solicitudes_en_proceso.pop(solicitud_key)
-            tiempo_respuesta_broker = time.time() - tiempo_inicio
+        # One hash lookup: pop with a default instead of an 'in' check first
+        tiempo_inicio = self.solicitudes_en_proceso.pop((client_address, worker_address), None)
+        if tiempo_inicio is not None:
+            # The reply completes an outstanding request, whether or not its
+            # client is still in the (bounded) clients table
+            self.client_requests_count -= 1
+            tiempo_respuesta_broker = (time.monotonic_ns() - tiempo_inicio) / 1e9
             
             # Extraer información de la respuesta para métricas
-            try:
-                response_data = json.loads(rest_frames[-1])
+            if response_data is not None:
                 facultad = response_data.get("facultad", "Desconocida")
                 
                 # Determinar tipo de operación basado en la respuesta
@@ -234,156 +527,192 @@ class LoadBalancerBroker:
                     tipo_operacion
                 )
                 
-                logging.info(f"Métricas broker registradas: {facultad} - {tiempo_respuesta_broker:.4f}s - {tipo_operacion}")
-                
-            except Exception as e:
-                logging.error(f"Error registrando métricas del broker: {e}")
+                logging.debug("Métricas broker registradas: %s - %.4fs - %s",
+                              facultad, tiempo_respuesta_broker, tipo_operacion)
         
-        # Update clients count if this is completing a request
-        if client_address in self.clients:
-            self.client_requests_count -= 1
-            
-            # Extract the response data to log
-            try:
-                response_data = json.loads(rest_frames[-1])
-                if "facultad" in response_data:
-                    logging.info(f"Respuesta enviada a: {response_data['facultad']} - {response_data['programa']}")
-            except:
-                pass
+        if response_data is not None and "facultad" in response_data:
+            logging.info(f"Respuesta enviada a: {response_data['facultad']} - {response_data.get('programa')}")
+        
+        # Una respuesta que no es un objeto JSON se sustituye por un mensaje de error
+        if has_payload and response_data is None:
+            logging.error(f"Respuesta inválida del trabajador: {payload}")
+            frames[-1] = _INVALID_RESPONSE
         
         # Forward the response to the client
         try:
-            # Asegurémonos de que la respuesta sea un JSON válido
-            if rest_frames and isinstance(rest_frames[-1], bytes):
-                try:
-                    # Intentar parsear para verificar que es un JSON válido
-                    json_data = json.loads(rest_frames[-1].decode('utf-8'))
-                    # Si llega aquí, el JSON es válido
-                except json.JSONDecodeError:
-                    # Si no es un JSON válido, enviar un mensaje de error formateado
-                    logging.error(f"Respuesta inválida del trabajador: {rest_frames[-1]}")
-                    error_response = json.dumps({"error": "Respuesta inválida del servidor"}).encode('utf-8')
-                    rest_frames[-1] = error_response
-            
-            # Enviar la respuesta al cliente
-            self.frontend.send_multipart([client_address, empty] + rest_frames)
+            # Enviar la respuesta al cliente: basta con quitar la dirección del
+            # worker y su delimitador, el resto de frames se reenvía tal cual
+            # (bytes sin copia extra; pyzmq sigue copiando los mensajes menores
+            # que zmq.COPY_THRESHOLD)
+            del frames[:2]
+            self.frontend.send_multipart(frames, copy=False, track=False)
             logging.info(f"Respuesta enviada al cliente {client_address}")
-        except Exception as e:
+        except zmq.ZMQError as e:
             logging.error(f"Error al reenviar respuesta al cliente: {e}")
             # Intentar enviar un mensaje de error en caso de fallo
             try:
-                error_msg = json.dumps({"error": f"Error interno del broker: {str(e)}"}).encode('utf-8')
-                self.frontend.send_multipart([client_address, empty, error_msg])
-            except:
+                error_msg = serializar({"error": f"Error interno del broker: {str(e)}"})
+                self.frontend.send_multipart(frames[:-1] + [error_msg], copy=False, track=False)
+            except zmq.ZMQError:
                 logging.error("No se pudo enviar mensaje de error al cliente")
     
-    def handle_client_message(self):
-        """Process messages from clients"""
-        # Client request format: [client_address, '', request]
-        frames = self.frontend.recv_multipart()
+    def handle_client_message(self, frames):
+        """Process a request received from a client"""
+        # Client request format: [client_address, ...envelope, request]; the
+        # envelope (delimiter plus any tag the client added) travels untouched
+        # to the worker and back
         
         # Extract client info
-        client_address = frames[0]
-        request = frames[2]
+        # zmq.Frame objects: the request payload is only read when it is parsed
+        client_address = frames[0].bytes
+        request = frames[-1]
         
-        try:
-            # Parse the request to extract faculty info for logging
-            request_data = json.loads(request)
-            
-            # Get or calculate client distance (for load balancing)
-            if client_address not in self.clients:
-                # Assign a distance based on faculty name (simulated)
-                faculty_name = request_data.get("facultad", "")
-                # Simple hash-based distance to simulate physical distance
-                distance = sum(ord(c) for c in faculty_name) % 10 + 1
-                self.clients[client_address] = {
-                    "faculty": faculty_name,
-                    "distance": distance,
-                    "first_seen": datetime.now(),
-                    "requests": 0
-                }
-            
-            # Update client stats
-            self.clients[client_address]["requests"] += 1
-            self.client_requests_count += 1
-            
-            # Incrementar contador de solicitudes procesadas
-            self.total_solicitudes_procesadas_broker += 1
-            
-            # Log the request
-            faculty = request_data.get("facultad", "unknown")
-            program = request_data.get("programa", "unknown")
-            logging.info(f"Solicitud recibida de: {faculty} - {program}")
-        except:
-            pass
+        client = self.clients.get(client_address)
+        tag = None
         
+        if client is None:
+            # First request from this client: parse it once to learn its faculty
+            tag = _request_tag(request.bytes)
+            faculty_name = "" if tag[0] is None else str(tag[0])
+            
+            client = {
+                "faculty": faculty_name,
+                "first_seen": datetime.now(),
+                "requests": 0
+            }
+            self.clients[client_address] = client
+            if len(self.clients) > BROKER_MAX_CLIENTES:
+                # Evict the least recently seen client
+                self.clients.popitem(last=False)
+        else:
+            self.clients.move_to_end(client_address)
+        
+        # Update client stats
+        client["requests"] += 1
+        self.client_requests_count += 1
+        
+        # Incrementar contador de solicitudes procesadas
+        self.total_solicitudes_procesadas_broker += 1
+        
+        # Log the request (only parse known clients' requests if INFO is enabled)
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            if tag is None:
+                tag = _request_tag(request.bytes)
+            faculty, program = tag
+            logging.info(f"Solicitud recibida de: {faculty or 'unknown'} - {program or 'unknown'}")
+        
+        if not self.dispatch_request(frames):
+            self.pending_requests.append(frames)
+    
+    def dispatch_request(self, frames):
+        """Forward a client request to a worker; False if no worker could take it"""
         # Get next available worker using load balancing
         worker_address = self.get_next_worker()
         
-        # Registrar tiempo de inicio para métricas del broker
-        solicitud_key = (client_address, worker_address)
-        self.solicitudes_en_proceso[solicitud_key] = time.time()
-        
         # Forward message to worker
-        self.backend.send_multipart([worker_address, b''] + frames)
+        try:
+            self.backend.send_multipart([worker_address, _EMPTY] + frames, flags=zmq.NOBLOCK, copy=False, track=False)
+        except zmq.Again:
+            # Worker pipe at its HWM: keep the worker and retry the request later
+            self.mark_available(worker_address)
+            return False
+        except zmq.ZMQError as e:
+            if e.errno != zmq.EHOSTUNREACH:
+                raise
+            # Worker disconnected: forget it and retry the request on another one
+            worker_id_short = self.workers.pop(worker_address, None) or worker_address.hex()[:8] + "..."
+            logging.warning(f"Trabajador desconectado: {worker_id_short}")
+            return False
+        
+        # Registrar tiempo de inicio para métricas del broker
+        solicitud_key = (frames[0].bytes, worker_address)
+        self.solicitudes_en_proceso[solicitud_key] = time.monotonic_ns()
+        return True
+    
+    def flush_pending_requests(self):
+        """Retry held-back requests in arrival order while workers accept them"""
+        while self.pending_requests and self.available_workers:
+            frames = self.pending_requests.popleft()
+            if not self.dispatch_request(frames):
+                self.pending_requests.appendleft(frames)
+                break
     
     def get_next_worker(self):
-        """Select the next worker using a simple load balancing algorithm"""
+        """Take the worker that has been idle the longest (LRU queue)"""
         if not self.available_workers:
             raise Exception("No workers available")
         
-        # Basic round-robin for now
-        return self.available_workers.pop(0)
+        # Each worker has at most one request in flight, so every idle worker
+        # carries the same load; the longest-idle one goes first
+        worker_address, _ = self.available_workers.popitem(last=False)
+        return worker_address
+    
+    def mark_available(self, worker_address):
+        """Append a worker to the ready queue unless it is already there (O(1))"""
+        if worker_address not in self.available_workers:
+            self.available_workers[worker_address] = None
+    
+    def poll_timeout(self):
+        """Milliseconds the poller may block: until the next timer is due"""
+        timeout = int((min(self.next_status, self.next_report) - time.monotonic()) * 1000)
+        if self.pending_requests or self.command_queue is not None:
+            # Held-back requests and queued commands have no fd to wake the poller
+            timeout = min(timeout, 100)
+        return max(timeout, 0)
+    
+    def run_timers(self):
+        """Refresh the status line and emit periodic reports when they are due"""
+        now = time.monotonic()
+        if now >= self.next_status:
+            self.next_status = now + MONITOR_INTERVAL
+            self.monitor_function()
+        if now >= self.next_report:
+            self.next_report = now + REPORT_INTERVAL
+            self.generar_reportes_periodicos()
     
     def monitor_function(self):
-        """Monitor function to display system status"""
-        while self.running:
-            sys.stdout.write(f"\rESTADO: Clientes activos: {len(self.clients)} | "
-                           f"Trabajadores disponibles: {len(self.available_workers)}/{len(self.workers)} | "
-                           f"Solicitudes pendientes: {self.client_requests_count}")
-            sys.stdout.flush()
-            time.sleep(1)
+        """Display system status"""
+        with self.stats_lock:
+            pendientes = self.client_requests_count
+        status = (len(self.clients), len(self.available_workers), len(self.workers), pendientes)
+        # Only redraw when something changed; os.write skips the sys.stdout lock
+        if status != self.last_status:
+            os.write(1, ("\rESTADO: Clientes activos: %d | "
+                         "Trabajadores disponibles: %d/%d | "
+                         "Solicitudes pendientes: %d" % status).encode("utf-8"))
+            self.last_status = status
             
     def cleanup_worker_list(self):
         """Limpia la lista de workers disponibles eliminando duplicados"""
-        # Eliminar duplicados manteniendo el orden
-        unique_workers = []
-        seen = set()
-        
-        for worker in self.available_workers:
-            if worker not in seen:
-                seen.add(worker)
-                unique_workers.append(worker)
-        
-        # Actualizar la lista de workers disponibles
-        old_count = len(self.available_workers)
-        self.available_workers = unique_workers
-        new_count = len(self.available_workers)
-        
-        if old_count != new_count:
-            logging.info(f"Lista de workers limpiada: {old_count} -> {new_count} (eliminados {old_count - new_count} duplicados)")
-        
-        return old_count - new_count
+        # La cola de workers es un OrderedDict por dirección y mark_available
+        # no reinserta un worker que ya está en ella: no puede haber duplicados
+        return 0
     
     def generar_reportes_periodicos(self):
         """
-        Función para generar reportes periódicos de métricas servidor-facultad en segundo plano.
+        Genera el reporte periódico de métricas servidor-facultad (cada REPORT_INTERVAL segundos).
         """
-        while self.running:
-            try:
-                time.sleep(300)  # Generar reporte cada 5 minutos
-                if self.running:  # Verificar que aún estemos ejecutándose
-                    reporte = self.monitor_metricas.generar_reporte_servidor_facultad(self.total_solicitudes_procesadas_broker)
-                    print(f"\nREPORTE PERIODICO: [BROKER] SERVIDOR-FACULTAD generado: {reporte['timestamp']}")
-                    logging.info(f"Reporte servidor-facultad generado desde broker: {reporte['timestamp']}")
-            except Exception as e:
-                logging.error(f"Error generando reporte periódico desde broker: {e}")
+        try:
+            with self.stats_lock:
+                total = self.total_solicitudes_procesadas_broker
+            reporte = self.monitor_metricas.generar_reporte_servidor_facultad(total)
+            if reporte.get('sin_cambios'):
+                logging.info(f"Reporte servidor-facultad sin cambios desde el anterior, no se escribe: {reporte['timestamp']}")
+                return
+            print(f"\nREPORTE PERIODICO: [BROKER] SERVIDOR-FACULTAD generado: {reporte['timestamp']}")
+            logging.info(f"Reporte servidor-facultad generado desde broker: {reporte['timestamp']}")
+        except Exception:
+            logging.exception("Error generando reporte periódico desde broker")
 
     def cleanup(self):
         """Clean up resources on exit"""
-        self.frontend.close()
-        self.backend.close()
+        if not self.native_mode:
+            self.frontend.close()
+            self.backend.close()
+        # In native mode the proxy thread closes the sockets it owns once it
+        # receives TERMINATE (or the context is terminated)
         self.context.term()
+        self.log_listener.stop()
 
 if __name__ == "__main__":
     broker = LoadBalancerBroker()
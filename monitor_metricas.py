@@ -11,13 +11,334 @@ Métricas recolectadas:
 - Tiempo promedio desde solicitud hasta atención de programas académicos
 """
 
+import re
 import time
+import math
 import threading
-from datetime import datetime
-from collections import defaultdict, deque
+from collections import deque
+from array import array
+from itertools import islice
 import json
 import os
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Escritura del encabezado del archivo de métricas en una sola llamada writev
+MAX_PARTES_WRITEV = 1024  # Límite habitual de IOV_MAX
+
+# Número de mediciones que conserva cada ventana de tiempos (potencia de dos:
+# la posición en el buffer circular se obtiene con una máscara de bits)
+TAMANO_VENTANA = 1024
+
+# Mediciones servidor-facultad encoladas antes de intentar consolidarlas
+MEDICIONES_POR_CONSOLIDACION = 4096
+
+# Plantillas fijas de las secciones del reporte, construidas una sola vez
+_SEPARADOR_REPORTE = "\n" + "=" * 70 + "\n"
+_PLANTILLA_SERVIDOR_FACULTAD = (
+    "\n1. MÉTRICAS SERVIDOR → FACULTADES:\n"
+    "   • Tiempo promedio de respuesta: {tiempo_promedio:.4f} segundos\n"
+    "   • Tiempo mínimo de respuesta: {tiempo_minimo:.4f} segundos\n"
+    "   • Tiempo máximo de respuesta: {tiempo_maximo:.4f} segundos\n"
+    "   • Percentil 50 (mediana): {tiempo_p50:.4f} segundos\n"
+    "   • Percentil 99: {tiempo_p99:.4f} segundos\n"
+    "   • Total de mediciones: {total_mediciones}\n"
+)
+_PLANTILLA_PROGRAMA_ATENCION = (
+    "\n2. MÉTRICAS PROGRAMA → ATENCIÓN:\n"
+    "   • Tiempo promedio solicitud-atención: {tiempo_promedio:.4f} segundos\n"
+    "   • Tiempo mínimo solicitud-atención: {tiempo_minimo:.4f} segundos\n"
+    "   • Tiempo máximo solicitud-atención: {tiempo_maximo:.4f} segundos\n"
+    "   • Percentil 50 (mediana): {tiempo_p50:.4f} segundos\n"
+    "   • Percentil 99: {tiempo_p99:.4f} segundos\n"
+    "   • Total de mediciones: {total_mediciones}\n"
+)
+_PLANTILLA_ESTADISTICAS_GENERALES = (
+    "\n3. ESTADÍSTICAS GENERALES:\n"
+    "   • Total solicitudes procesadas: {total_solicitudes_procesadas}\n"
+    "   • Total respuestas enviadas: {total_respuestas_enviadas}\n"
+    "   • Solicitudes en progreso: {solicitudes_en_progreso}\n"
+)
+
+def _anidar(plantilla, seccion):
+    """Hace que los campos de una plantilla de sección lean reporte[seccion][campo]."""
+    return re.sub(r"\{(\w+)", "{" + seccion + r"[\1]", plantilla)
+
+# Reportes completos: cada uno se formatea con un solo format_map(reporte)
+_PLANTILLA_REPORTE_METRICAS = (
+    "\n--- REPORTE DE MÉTRICAS - {timestamp} ---\n"
+    + _anidar(_PLANTILLA_SERVIDOR_FACULTAD, "metricas_servidor_facultad")
+    + _anidar(_PLANTILLA_PROGRAMA_ATENCION, "metricas_programa_atencion")
+    + _anidar(_PLANTILLA_ESTADISTICAS_GENERALES, "estadisticas_generales")
+    + _SEPARADOR_REPORTE
+)
+_PLANTILLA_REPORTE_PROGRAMA = (
+    "\n--- REPORTE PROGRAMA-ATENCIÓN - {timestamp} ---\n"
+    + _anidar(_PLANTILLA_PROGRAMA_ATENCION, "metricas_programa_atencion")
+    + "   • Total respuestas enviadas: {total_respuestas_enviadas}\n"
+    + _SEPARADOR_REPORTE
+)
+_PLANTILLA_REPORTE_SERVIDOR = (
+    "\n--- REPORTE SERVIDOR-FACULTAD - {timestamp} ---\n"
+    + _anidar(_PLANTILLA_SERVIDOR_FACULTAD, "metricas_servidor_facultad")
+    + "   • Total solicitudes procesadas: {total_solicitudes_procesadas}\n"
+    + _SEPARADOR_REPORTE
+)
+
+FORMATO_MARCA_TIEMPO = "%Y-%m-%d %H:%M:%S"
+
+def codificar_texto(texto):
+    """
+    Codifica texto para el archivo de métricas con los mismos bytes que
+    escribiría un archivo abierto en modo texto con encoding='utf-8': los
+    saltos de línea se traducen a os.linesep ("\\r\\n" en Windows).
+    
+    Args:
+        texto (str): Texto a escribir
+    
+    Returns:
+        bytes: Texto codificado en UTF-8
+    """
+    if os.linesep != "\n":
+        texto = texto.replace("\n", os.linesep)
+    return texto.encode("utf-8")
+
+# Encabezado del archivo de métricas, ya codificado (la fecha va entre ambas partes)
+_ENCABEZADO_ARCHIVO = codificar_texto("=== SISTEMA DE MONITOREO DE MÉTRICAS DE TIEMPO DE RESPUESTA ===\n")
+_CIERRE_ENCABEZADO = codificar_texto("=" * 70 + "\n\n")
+
+# Última marca de tiempo formateada: (segundo, texto)
+_ultima_marca_tiempo = (None, "")
+
+def marca_tiempo(instante=None):
+    """
+    Retorna una hora local con formato FORMATO_MARCA_TIEMPO.
+    
+    La resolución es de un segundo, así que el texto se formatea una sola vez
+    por segundo con time.strftime y se reutiliza en las demás llamadas.
+    
+    Args:
+        instante (float, optional): Segundos desde epoch (time.time()); por
+            defecto, la hora actual
+    
+    Returns:
+        str: Marca de tiempo "AAAA-MM-DD HH:MM:SS"
+    """
+    global _ultima_marca_tiempo
+    segundo = int(time.time() if instante is None else instante)
+    cache = _ultima_marca_tiempo
+    if cache[0] != segundo:
+        cache = (segundo, time.strftime(FORMATO_MARCA_TIEMPO, time.localtime(segundo)))
+        _ultima_marca_tiempo = cache
+    return cache[1]
+
+def escribir_partes(fd, partes):
+    """
+    Escribe una lista de fragmentos bytes en un descriptor de archivo con una
+    única llamada al sistema (os.writev) cuando la plataforma lo permite.
+    
+    Args:
+        fd (int): Descriptor de archivo abierto para escritura
+        partes (list): Fragmentos bytes a escribir en orden
+    """
+    if hasattr(os, "writev") and len(partes) <= MAX_PARTES_WRITEV:
+        escritos = os.writev(fd, partes)
+        if escritos == sum(map(len, partes)):
+            return
+        restante = b"".join(partes)[escritos:]
+    else:
+        restante = b"".join(partes)
+    
+    # Escritura parcial o plataforma sin writev: completar con write()
+    while restante:
+        escritos = os.write(fd, restante)
+        restante = restante[escritos:]
+
+if njit is not None:
+    @njit(cache=True)
+    def _estadisticas_por_grupo(tiempos, grupos, n_grupos):
+        """Suma, mínimo, máximo y conteo por grupo en una pasada compilada."""
+        sumas = np.zeros(n_grupos)
+        minimos = np.full(n_grupos, np.inf)
+        maximos = np.zeros(n_grupos)
+        conteos = np.zeros(n_grupos, dtype=np.int64)
+        # Secuencial: con prange varias iteraciones escribirían el mismo grupo
+        for i in range(tiempos.shape[0]):
+            grupo = grupos[i]
+            tiempo = tiempos[i]
+            sumas[grupo] += tiempo
+            if tiempo < minimos[grupo]:
+                minimos[grupo] = tiempo
+            if tiempo > maximos[grupo]:
+                maximos[grupo] = tiempo
+            conteos[grupo] += 1
+        return sumas, minimos, maximos, conteos
+
+class _VentanaTiempos:
+    """
+    Últimas TAMANO_VENTANA mediciones de tiempo guardadas como arreglos
+    paralelos (array.array) en un buffer circular, con suma, mínimo y máximo
+    mantenidos de forma incremental.
+    
+    Cada medición ocupa una posición en tres arreglos contiguos: tiempo,
+    instante (time.time()) y grupo (id entero de la facultad). La suma se
+    actualiza al entrar y salir cada medición; el mínimo y el máximo se
+    obtienen de colas monótonas, así que agregar una medición y consultar
+    las métricas cuestan O(1) amortizado.
+    """
+    
+    def __init__(self, tamano=TAMANO_VENTANA):
+        if tamano <= 0 or tamano & (tamano - 1):
+            raise ValueError(f"El tamaño de la ventana debe ser potencia de dos: {tamano}")
+        self.tamano = tamano
+        self._mascara = tamano - 1
+        self.tiempos = array('d', bytes(8 * tamano))
+        self.instantes = array('d', bytes(8 * tamano))
+        self.grupos = array('H', bytes(2 * tamano))
+        self.total = 0
+        self.suma = 0.0
+        self._secuencia = 0
+        # (secuencia, tiempo) con tiempos crecientes / decrecientes
+        self._minimos = deque()
+        self._maximos = deque()
+    
+    def agregar(self, tiempo, grupo=0, instante=0.0):
+        """Añade una medición, reemplazando la más antigua si la ventana está llena."""
+        secuencia = self._secuencia
+        self._secuencia = secuencia + 1
+        
+        posicion = secuencia & self._mascara
+        if self.total == self.tamano:
+            self.suma -= self.tiempos[posicion]
+        else:
+            self.total += 1
+        self.tiempos[posicion] = tiempo
+        self.instantes[posicion] = instante
+        self.grupos[posicion] = grupo
+        self.suma += tiempo
+        
+        minimos = self._minimos
+        while minimos and minimos[-1][1] >= tiempo:
+            minimos.pop()
+        minimos.append((secuencia, tiempo))
+        maximos = self._maximos
+        while maximos and maximos[-1][1] <= tiempo:
+            maximos.pop()
+        maximos.append((secuencia, tiempo))
+        
+        # Retirar extremos que ya salieron de la ventana
+        limite = secuencia - self.tamano
+        if minimos[0][0] <= limite:
+            minimos.popleft()
+        if maximos[0][0] <= limite:
+            maximos.popleft()
+        
+        # Recalcular la suma exacta una vez por vuelta para no acumular error
+        if not self._secuencia & self._mascara:
+            self.suma = math.fsum(self.tiempos)
+    
+    def percentiles(self):
+        """
+        Retorna la mediana y el percentil 99 de la ventana (ventana no vacía).
+        
+        Con numpy se usa selección lineal (np.partition) sobre una vista de los
+        tiempos; sin numpy se ordena una copia de la ventana.
+        """
+        total = self.total
+        k50 = total // 2
+        k99 = min(int(0.99 * total), total - 1)
+        if np is not None:
+            tiempos = np.frombuffer(self.tiempos, dtype=np.float64)[:total]
+            seleccion = np.partition(tiempos, (k50, k99))
+            return float(seleccion[k50]), float(seleccion[k99])
+        ordenados = sorted(islice(self.tiempos, total))
+        return ordenados[k50], ordenados[k99]
+    
+    def metricas(self):
+        """
+        Retorna promedio, mínimo, máximo, percentiles y número de mediciones de la ventana.
+        
+        Returns:
+            dict: tiempo_promedio, tiempo_minimo, tiempo_maximo, tiempo_p50,
+                  tiempo_p99, total_mediciones
+        """
+        total = self.total
+        if not total:
+            return {
+                'tiempo_promedio': 0.0,
+                'tiempo_minimo': 0.0,
+                'tiempo_maximo': 0.0,
+                'tiempo_p50': 0.0,
+                'tiempo_p99': 0.0,
+                'total_mediciones': 0
+            }
+        p50, p99 = self.percentiles()
+        return {
+            'tiempo_promedio': self.suma / total,
+            'tiempo_minimo': self._minimos[0][1],
+            'tiempo_maximo': self._maximos[0][1],
+            'tiempo_p50': p50,
+            'tiempo_p99': p99,
+            'total_mediciones': total
+        }
+    
+    def metricas_por_grupo(self):
+        """
+        Agrupa las mediciones de la ventana por grupo en una sola pasada.
+        
+        Returns:
+            dict: {grupo: {'promedio', 'minimo', 'maximo', 'mediciones'}}
+        """
+        total = self.total
+        if njit is not None and total:
+            # Vistas sin copia de los arreglos de la ventana
+            grupos = np.frombuffer(self.grupos, dtype=np.uint16)[:total]
+            sumas, minimos, maximos, conteos = _estadisticas_por_grupo(
+                np.frombuffer(self.tiempos, dtype=np.float64)[:total],
+                grupos,
+                int(grupos.max()) + 1
+            )
+            return {
+                grupo: {
+                    'promedio': float(sumas[grupo] / conteos[grupo]),
+                    'minimo': float(minimos[grupo]),
+                    'maximo': float(maximos[grupo]),
+                    'mediciones': int(conteos[grupo])
+                }
+                for grupo in np.flatnonzero(conteos).tolist()
+            }
+        
+        # islice recorre los arreglos en su lugar, sin copiar la ventana
+        acumulado = {}
+        for grupo, tiempo in zip(islice(self.grupos, total), islice(self.tiempos, total)):
+            datos = acumulado.get(grupo)
+            if datos is None:
+                acumulado[grupo] = [tiempo, tiempo, tiempo, 1]
+            else:
+                datos[0] += tiempo
+                if tiempo < datos[1]:
+                    datos[1] = tiempo
+                if tiempo > datos[2]:
+                    datos[2] = tiempo
+                datos[3] += 1
+        return {
+            grupo: {
+                'promedio': suma / mediciones,
+                'minimo': minimo,
+                'maximo': maximo,
+                'mediciones': mediciones
+            }
+            for grupo, (suma, minimo, maximo, mediciones) in acumulado.items()
+        }
+
 class MonitorMetricas:
     def __init__(self, archivo_metricas="metricas_sistema.txt"):
         """
@@ -29,31 +350,64 @@ class MonitorMetricas:
         self.archivo_metricas = archivo_metricas
         self.lock = threading.Lock()
         
-        # Almacenamiento de tiempos de respuesta servidor-facultad
-        self.tiempos_servidor_facultad = deque(maxlen=1000)  # Últimas 1000 mediciones
+        # Tiempos de respuesta servidor-facultad y programa-atención
+        # (últimas TAMANO_VENTANA mediciones de cada tipo)
+        self._ventana_servidor = _VentanaTiempos()
+        self._ventana_programa = _VentanaTiempos()
+        
+        # Mediciones aún no agregadas a las ventanas: (tiempo, facultad, instante).
+        # Se encolan sin tomar el lock y se consolidan en lote
+        self._mediciones_servidor = deque()
+        self._mediciones_programa = deque()
         
-        # Almacenamiento de tiempos programa-atención
-        self.tiempos_programa_atencion = deque(maxlen=1000)  # Últimas 1000 mediciones
+        # Facultades internadas como enteros para los arreglos de las ventanas
+        self._ids_facultad = {}
+        self._nombres_facultad = []
         
-        # Diccionario para rastrear solicitudes en progreso
+        # Solicitudes en progreso: {id_solicitud: (inicio_ns, facultad, programa)},
+        # con inicio_ns de time.monotonic_ns() (no retrocede con ajustes del reloj)
         self.solicitudes_en_progreso = {}
         
         # Contadores para estadísticas
         self.total_solicitudes_procesadas = 0
         self.total_respuestas_enviadas = 0
         
-
+        # Último reporte generado de cada tipo junto con los contadores que lo
+        # produjeron: si no llegaron mediciones nuevas se reutiliza sin escribir
+        self._ultimos_reportes = {}
+        
+        # Manejador persistente del archivo de métricas (se abre en la primera escritura)
+        self._archivo = None
+        self._lock_archivo = threading.Lock()
         
         # Inicializar archivo de métricas si no existe
         self._inicializar_archivo_metricas()
     
     def _inicializar_archivo_metricas(self):
         """Inicializa el archivo de métricas con encabezados si no existe."""
-        if not os.path.exists(self.archivo_metricas):
-            with open(self.archivo_metricas, 'w', encoding='utf-8') as archivo:
-                archivo.write("=== SISTEMA DE MONITOREO DE MÉTRICAS DE TIEMPO DE RESPUESTA ===\n")
-                archivo.write(f"Archivo creado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                archivo.write("=" * 70 + "\n\n")
+        # O_EXCL crea el archivo de forma atómica: si otro proceso lo creó
+        # primero no se sobrescribe su encabezado
+        try:
+            fd = os.open(self.archivo_metricas, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return
+        try:
+            escribir_partes(fd, [
+                _ENCABEZADO_ARCHIVO,
+                codificar_texto(f"Archivo creado: {marca_tiempo()}\n"),
+                _CIERRE_ENCABEZADO
+            ])
+        finally:
+            os.close(fd)
+    
+    def _id_facultad(self, facultad):
+        """Retorna el id entero de una facultad, asignándolo la primera vez (con self.lock tomado)."""
+        id_facultad = self._ids_facultad.get(facultad)
+        if id_facultad is None:
+            id_facultad = len(self._nombres_facultad)
+            self._ids_facultad[facultad] = id_facultad
+            self._nombres_facultad.append(facultad)
+        return id_facultad
     
     def registrar_inicio_solicitud_programa(self, id_solicitud, facultad, programa):
         """
@@ -64,14 +418,8 @@ class MonitorMetricas:
             facultad (str): Nombre de la facultad
             programa (str): Nombre del programa académico
         """
-        with self.lock:
-            tiempo_inicio = time.time()
-            self.solicitudes_en_progreso[id_solicitud] = {
-                'tiempo_inicio': tiempo_inicio,
-                'facultad': facultad,
-                'programa': programa,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
+        # Asignar una clave del diccionario es atómico: no hace falta el lock
+        self.solicitudes_en_progreso[id_solicitud] = (time.monotonic_ns(), facultad, programa)
     
     def registrar_fin_solicitud_programa(self, id_solicitud):
         """
@@ -83,23 +431,22 @@ class MonitorMetricas:
         Returns:
             float: Tiempo total de procesamiento en segundos, o None si no se encontró la solicitud
         """
-        with self.lock:
-            if id_solicitud in self.solicitudes_en_progreso:
-                tiempo_fin = time.time()
-                solicitud = self.solicitudes_en_progreso.pop(id_solicitud)
-                tiempo_total = tiempo_fin - solicitud['tiempo_inicio']
-                
-                # Almacenar el tiempo de programa-atención
-                self.tiempos_programa_atencion.append({
-                    'tiempo': tiempo_total,
-                    'facultad': solicitud['facultad'],
-                    'programa': solicitud['programa'],
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                })
-                
-                self.total_solicitudes_procesadas += 1
-                return tiempo_total
+        solicitud = self.solicitudes_en_progreso.pop(id_solicitud, None)
+        if solicitud is None:
             return None
+        inicio_ns, facultad, _programa = solicitud
+        tiempo_total = (time.monotonic_ns() - inicio_ns) / 1e9
+        tiempo_fin = time.time()
+        
+        # Encolar el tiempo de programa-atención; se agrega a la ventana en lote
+        mediciones = self._mediciones_programa
+        mediciones.append((tiempo_total, facultad, tiempo_fin))
+        if len(mediciones) >= MEDICIONES_POR_CONSOLIDACION and self.lock.acquire(blocking=False):
+            try:
+                self._consolidar_mediciones()
+            finally:
+                self.lock.release()
+        return tiempo_total
     
     def registrar_tiempo_respuesta_servidor(self, tiempo_respuesta, facultad, operacion="asignacion"):
         """
@@ -110,14 +457,37 @@ class MonitorMetricas:
             facultad (str): Nombre de la facultad
             operacion (str): Tipo de operación realizada
         """
+        mediciones = self._mediciones_servidor
+        mediciones.append((tiempo_respuesta, facultad, time.time()))
+        if len(mediciones) >= MEDICIONES_POR_CONSOLIDACION and self.lock.acquire(blocking=False):
+            try:
+                self._consolidar_mediciones()
+            finally:
+                self.lock.release()
+    
+    def _consolidar_mediciones(self):
+        """Agrega a las ventanas las mediciones encoladas (llamar con self.lock tomado)."""
+        self.total_respuestas_enviadas += self._vaciar_mediciones(
+            self._mediciones_servidor, self._ventana_servidor)
+        self.total_solicitudes_procesadas += self._vaciar_mediciones(
+            self._mediciones_programa, self._ventana_programa)
+    
+    def _vaciar_mediciones(self, mediciones, ventana):
+        """Pasa una cola de mediciones a su ventana y retorna cuántas agregó (con self.lock tomado)."""
+        agregadas = 0
+        while True:
+            try:
+                tiempo, facultad, instante = mediciones.popleft()
+            except IndexError:
+                break
+            ventana.agregar(tiempo, self._id_facultad(facultad), instante)
+            agregadas += 1
+        return agregadas
+    
+    def _contadores_al_dia(self):
+        """Consolida las mediciones pendientes para que los contadores estén al día."""
         with self.lock:
-            self.tiempos_servidor_facultad.append({
-                'tiempo': tiempo_respuesta,
-                'facultad': facultad,
-                'operacion': operacion,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            })
-            self.total_respuestas_enviadas += 1
+            self._consolidar_mediciones()
     
 
     
@@ -126,25 +496,11 @@ class MonitorMetricas:
         Calcula las métricas de tiempo de respuesta servidor-facultad.
         
         Returns:
-            dict: Diccionario con tiempo promedio, mínimo y máximo
+            dict: Diccionario con tiempo promedio, mínimo, máximo, p50 y p99
         """
         with self.lock:
-            if not self.tiempos_servidor_facultad:
-                return {
-                    'tiempo_promedio': 0.0,
-                    'tiempo_minimo': 0.0,
-                    'tiempo_maximo': 0.0,
-                    'total_mediciones': 0
-                }
-            
-            tiempos = [medicion['tiempo'] for medicion in self.tiempos_servidor_facultad]
-            
-            return {
-                'tiempo_promedio': sum(tiempos) / len(tiempos),
-                'tiempo_minimo': min(tiempos),
-                'tiempo_maximo': max(tiempos),
-                'total_mediciones': len(tiempos)
-            }
+            self._consolidar_mediciones()
+            return self._ventana_servidor.metricas()
     
     def calcular_metricas_programa_atencion(self):
         """
@@ -154,36 +510,51 @@ class MonitorMetricas:
             dict: Diccionario con tiempo promedio y estadísticas adicionales
         """
         with self.lock:
-            if not self.tiempos_programa_atencion:
-                return {
-                    'tiempo_promedio': 0.0,
-                    'tiempo_minimo': 0.0,
-                    'tiempo_maximo': 0.0,
-                    'total_mediciones': 0
-                }
-            
-            tiempos = [medicion['tiempo'] for medicion in self.tiempos_programa_atencion]
-            
-            return {
-                'tiempo_promedio': sum(tiempos) / len(tiempos),
-                'tiempo_minimo': min(tiempos),
-                'tiempo_maximo': max(tiempos),
-                'total_mediciones': len(tiempos)
-            }
+            self._consolidar_mediciones()
+            return self._ventana_programa.metricas()
     
 
     
+    def _reporte_previo(self, tipo, firma):
+        """
+        Devuelve el último reporte de un tipo si sus contadores no han cambiado.
+        
+        El reporte devuelto es una copia con la marca de tiempo actual y
+        'sin_cambios' en True, para que quien lo muestre no lo presente como
+        recién escrito con la hora del reporte anterior.
+        
+        Args:
+            tipo (str): Tipo de reporte
+            firma (tuple): Contadores de los que depende el reporte
+        
+        Returns:
+            dict | None: Reporte anterior, o None si hay que generarlo de nuevo
+        """
+        previo = self._ultimos_reportes.get(tipo)
+        if previo is not None and previo[0] == firma:
+            return {**previo[1], 'timestamp': marca_tiempo(), 'sin_cambios': True}
+        return None
+    
     def generar_reporte_metricas(self):
         """
         Genera un reporte completo de todas las métricas y lo guarda en el archivo.
+        Si no hubo actividad desde el reporte anterior no se escribe y se
+        devuelve el anterior marcado con 'sin_cambios'.
         
         Returns:
             dict: Diccionario con todas las métricas calculadas
         """
+        self._contadores_al_dia()
+        firma = (self.total_solicitudes_procesadas, self.total_respuestas_enviadas,
+                 len(self.solicitudes_en_progreso))
+        previo = self._reporte_previo('metricas', firma)
+        if previo is not None:
+            return previo
+        
         metricas_servidor = self.calcular_metricas_servidor_facultad()
         metricas_programa = self.calcular_metricas_programa_atencion()
         
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        timestamp = marca_tiempo()
         
         reporte = {
             'timestamp': timestamp,
@@ -198,18 +569,27 @@ class MonitorMetricas:
         
         # Escribir reporte al archivo
         self._escribir_reporte_archivo(reporte)
+        self._ultimos_reportes['metricas'] = (firma, reporte)
         
         return reporte
     
     def generar_reporte_programa_atencion(self):
         """
         Genera solo el reporte de métricas programa-atención.
+        Si no hubo actividad desde el reporte anterior no se escribe y se
+        devuelve el anterior marcado con 'sin_cambios'.
         
         Returns:
             dict: Diccionario con las métricas de programa-atención
         """
+        self._contadores_al_dia()
+        firma = (self.total_solicitudes_procesadas, self.total_respuestas_enviadas)
+        previo = self._reporte_previo('programa', firma)
+        if previo is not None:
+            return previo
+        
         metricas_programa = self.calcular_metricas_programa_atencion()
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        timestamp = marca_tiempo()
         
         reporte = {
             'timestamp': timestamp,
@@ -219,12 +599,15 @@ class MonitorMetricas:
         
         # Escribir solo la sección de programa-atención
         self._escribir_reporte_programa_archivo(reporte)
+        self._ultimos_reportes['programa'] = (firma, reporte)
         
         return reporte
     
     def generar_reporte_servidor_facultad(self, total_solicitudes_broker=None):
         """
         Genera solo el reporte de métricas servidor-facultad.
+        Si no hubo actividad desde el reporte anterior no se escribe y se
+        devuelve el anterior marcado con 'sin_cambios'.
         
         Args:
             total_solicitudes_broker (int, optional): Total de solicitudes procesadas por el broker
@@ -232,12 +615,18 @@ class MonitorMetricas:
         Returns:
             dict: Diccionario con las métricas servidor-facultad
         """
-        metricas_servidor = self.calcular_metricas_servidor_facultad()
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
         # Usar el contador del broker si se proporciona, sino usar el contador local
         total_solicitudes = total_solicitudes_broker if total_solicitudes_broker is not None else self.total_solicitudes_procesadas
         
+        self._contadores_al_dia()
+        firma = (self.total_respuestas_enviadas, total_solicitudes)
+        previo = self._reporte_previo('servidor', firma)
+        if previo is not None:
+            return previo
+        
+        metricas_servidor = self.calcular_metricas_servidor_facultad()
+        timestamp = marca_tiempo()
+        
         reporte = {
             'timestamp': timestamp,
             'metricas_servidor_facultad': metricas_servidor,
@@ -246,11 +635,37 @@ class MonitorMetricas:
         
         # Escribir solo la sección de servidor-facultad
         self._escribir_reporte_servidor_archivo(reporte)
+        self._ultimos_reportes['servidor'] = (firma, reporte)
         
         return reporte
     
 
     
+    def _escribir_archivo(self, partes):
+        """
+        Añade un reporte al archivo de métricas usando un manejador persistente.
+        
+        El archivo se abre una sola vez en modo append y sin búfer. Cada
+        reporte llega al archivo en el momento de generarse, con una sola
+        llamada write: nada queda retenido en memoria si el proceso termina
+        sin pasar por atexit (señales, os._exit en procesos hijos).
+        
+        Args:
+            partes (list): Fragmentos de texto del reporte, en orden
+        """
+        datos = codificar_texto("".join(partes))
+        with self._lock_archivo:
+            if self._archivo is None:
+                self._archivo = open(self.archivo_metricas, 'ab', buffering=0)
+            self._archivo.write(datos)
+    
+    def cerrar_archivo(self):
+        """Cierra el archivo de métricas si está abierto."""
+        with self._lock_archivo:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+    
     def _escribir_reporte_archivo(self, reporte):
         """
         Escribe el reporte de métricas al archivo de texto.
@@ -258,33 +673,7 @@ class MonitorMetricas:
         Args:
             reporte (dict): Diccionario con las métricas a escribir
         """
-        with open(self.archivo_metricas, 'a', encoding='utf-8') as archivo:
-            archivo.write(f"\n--- REPORTE DE MÉTRICAS - {reporte['timestamp']} ---\n")
-            
-            # Métricas servidor-facultad
-            servidor = reporte['metricas_servidor_facultad']
-            archivo.write("\n1. MÉTRICAS SERVIDOR → FACULTADES:\n")
-            archivo.write(f"   • Tiempo promedio de respuesta: {servidor['tiempo_promedio']:.4f} segundos\n")
-            archivo.write(f"   • Tiempo mínimo de respuesta: {servidor['tiempo_minimo']:.4f} segundos\n")
-            archivo.write(f"   • Tiempo máximo de respuesta: {servidor['tiempo_maximo']:.4f} segundos\n")
-            archivo.write(f"   • Total de mediciones: {servidor['total_mediciones']}\n")
-            
-            # Métricas programa-atención
-            programa = reporte['metricas_programa_atencion']
-            archivo.write("\n2. MÉTRICAS PROGRAMA → ATENCIÓN:\n")
-            archivo.write(f"   • Tiempo promedio solicitud-atención: {programa['tiempo_promedio']:.4f} segundos\n")
-            archivo.write(f"   • Tiempo mínimo solicitud-atención: {programa['tiempo_minimo']:.4f} segundos\n")
-            archivo.write(f"   • Tiempo máximo solicitud-atención: {programa['tiempo_maximo']:.4f} segundos\n")
-            archivo.write(f"   • Total de mediciones: {programa['total_mediciones']}\n")
-            
-            # Estadísticas generales
-            stats = reporte['estadisticas_generales']
-            archivo.write("\n3. ESTADÍSTICAS GENERALES:\n")
-            archivo.write(f"   • Total solicitudes procesadas: {stats['total_solicitudes_procesadas']}\n")
-            archivo.write(f"   • Total respuestas enviadas: {stats['total_respuestas_enviadas']}\n")
-            archivo.write(f"   • Solicitudes en progreso: {stats['solicitudes_en_progreso']}\n")
-            
-            archivo.write("\n" + "=" * 70 + "\n")
+        self._escribir_archivo([_PLANTILLA_REPORTE_METRICAS.format_map(reporte)])
     
     def _escribir_reporte_programa_archivo(self, reporte):
         """
@@ -293,19 +682,7 @@ class MonitorMetricas:
         Args:
             reporte (dict): Diccionario con las métricas de programa-atención
         """
-        with open(self.archivo_metricas, 'a', encoding='utf-8') as archivo:
-            archivo.write(f"\n--- REPORTE PROGRAMA-ATENCIÓN - {reporte['timestamp']} ---\n")
-            
-            # Métricas programa-atención
-            programa = reporte['metricas_programa_atencion']
-            archivo.write("\n2. MÉTRICAS PROGRAMA → ATENCIÓN:\n")
-            archivo.write(f"   • Tiempo promedio solicitud-atención: {programa['tiempo_promedio']:.4f} segundos\n")
-            archivo.write(f"   • Tiempo mínimo solicitud-atención: {programa['tiempo_minimo']:.4f} segundos\n")
-            archivo.write(f"   • Tiempo máximo solicitud-atención: {programa['tiempo_maximo']:.4f} segundos\n")
-            archivo.write(f"   • Total de mediciones: {programa['total_mediciones']}\n")
-            archivo.write(f"   • Total respuestas enviadas: {reporte['total_respuestas_enviadas']}\n")
-            
-            archivo.write("\n" + "=" * 70 + "\n")
+        self._escribir_archivo([_PLANTILLA_REPORTE_PROGRAMA.format_map(reporte)])
     
     def _escribir_reporte_servidor_archivo(self, reporte):
         """
@@ -314,19 +691,7 @@ class MonitorMetricas:
         Args:
             reporte (dict): Diccionario con las métricas servidor-facultad
         """
-        with open(self.archivo_metricas, 'a', encoding='utf-8') as archivo:
-            archivo.write(f"\n--- REPORTE SERVIDOR-FACULTAD - {reporte['timestamp']} ---\n")
-            
-            # Métricas servidor-facultad
-            servidor = reporte['metricas_servidor_facultad']
-            archivo.write("\n1. MÉTRICAS SERVIDOR → FACULTADES:\n")
-            archivo.write(f"   • Tiempo promedio de respuesta: {servidor['tiempo_promedio']:.4f} segundos\n")
-            archivo.write(f"   • Tiempo mínimo de respuesta: {servidor['tiempo_minimo']:.4f} segundos\n")
-            archivo.write(f"   • Tiempo máximo de respuesta: {servidor['tiempo_maximo']:.4f} segundos\n")
-            archivo.write(f"   • Total de mediciones: {servidor['total_mediciones']}\n")
-            archivo.write(f"   • Total solicitudes procesadas: {reporte['total_solicitudes_procesadas']}\n")
-            
-            archivo.write("\n" + "=" * 70 + "\n")
+        self._escribir_archivo([_PLANTILLA_REPORTE_SERVIDOR.format_map(reporte)])
     
 
     
@@ -338,43 +703,16 @@ class MonitorMetricas:
             dict: Métricas organizadas por facultad
         """
         with self.lock:
-            metricas_por_facultad = defaultdict(lambda: {
-                'tiempos_servidor': [],
-                'tiempos_programa': []
-            })
-            
-            # Agrupar tiempos servidor-facultad
-            for medicion in self.tiempos_servidor_facultad:
-                facultad = medicion['facultad']
-                metricas_por_facultad[facultad]['tiempos_servidor'].append(medicion['tiempo'])
-            
-            # Agrupar tiempos programa-atención
-            for medicion in self.tiempos_programa_atencion:
-                facultad = medicion['facultad']
-                metricas_por_facultad[facultad]['tiempos_programa'].append(medicion['tiempo'])
+            self._consolidar_mediciones()
+            por_grupo_servidor = self._ventana_servidor.metricas_por_grupo()
+            por_grupo_programa = self._ventana_programa.metricas_por_grupo()
+            nombres = self._nombres_facultad
             
-            # Calcular estadísticas por facultad
             resultado = {}
-            for facultad, datos in metricas_por_facultad.items():
-                resultado[facultad] = {}
-                
-                if datos['tiempos_servidor']:
-                    tiempos_srv = datos['tiempos_servidor']
-                    resultado[facultad]['servidor'] = {
-                        'promedio': sum(tiempos_srv) / len(tiempos_srv),
-                        'minimo': min(tiempos_srv),
-                        'maximo': max(tiempos_srv),
-                        'mediciones': len(tiempos_srv)
-                    }
-                
-                if datos['tiempos_programa']:
-                    tiempos_prog = datos['tiempos_programa']
-                    resultado[facultad]['programa'] = {
-                        'promedio': sum(tiempos_prog) / len(tiempos_prog),
-                        'minimo': min(tiempos_prog),
-                        'maximo': max(tiempos_prog),
-                        'mediciones': len(tiempos_prog)
-                    }
+            for id_facultad, metricas in por_grupo_servidor.items():
+                resultado.setdefault(nombres[id_facultad], {})['servidor'] = metricas
+            for id_facultad, metricas in por_grupo_programa.items():
+                resultado.setdefault(nombres[id_facultad], {})['programa'] = metricas
             
             return resultado
 
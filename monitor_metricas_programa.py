@@ -12,8 +12,51 @@ Genera reportes en archivo separado: metricas_por_programa.txt
 
 import threading
 import time
-from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
+from monitor_metricas import codificar_texto, marca_tiempo
+
+# Eventos registrados que se acumulan antes de consolidarlos en los contadores
+EVENTOS_POR_CONSOLIDACION = 4096
+
+# Contadores de _RegistroPrograma que puede incrementar un evento
+ATENDIDOS = "atendidos"
+RECHAZADOS_FACULTAD = "rechazados_facultad"
+RECHAZADOS_SERVIDOR = "rechazados_servidor"
+ERRORES_COMUNICACION = "errores_comunicacion"
+
+# Entradas de la caché de bloques formateados (potencia de 2: índice por máscara)
+MAX_BLOQUES_CACHE = 512
+
+# Plantillas fijas del reporte por programa, construidas una sola vez
+_TITULO_SECCION = "3. MÉTRICAS POR PROGRAMA:\n\n"
+_SIN_DATOS = "   📊 No hay datos de programas registrados aún.\n\n"
+_SEPARADOR_FACULTAD = "   " + "-" * 50 + "\n"
+_PLANTILLA_BLOQUE_PROGRAMA = (
+    "   🎓 Programa: {programa}\n"
+    "      • Requerimientos atendidos satisfactoriamente: {atendidos_satisfactoriamente}\n"
+    "      • Requerimientos rechazados por facultad: {rechazados_por_facultad}\n"
+    "      • Requerimientos rechazados por servidor: {rechazados_por_servidor}\n"
+    "      • Errores de comunicación: {errores_comunicacion}\n"
+    "      • Total de requerimientos: {total_requerimientos}\n"
+    "      • Porcentaje de éxito: {porcentaje_exito:.1f}%\n"
+    "      • Porcentaje rechazo facultad: {porcentaje_rechazo_facultad:.1f}%\n"
+    "      • Porcentaje rechazo servidor: {porcentaje_rechazo_servidor:.1f}%\n"
+    "      • Porcentaje errores: {porcentaje_errores:.1f}%\n"
+    "      • Último registro: {ultimo_timestamp}\n\n"
+)
+
+class _RegistroPrograma:
+    """Contadores de un programa; __slots__ evita un diccionario por instancia."""
+    
+    __slots__ = ("atendidos", "rechazados_facultad", "rechazados_servidor",
+                 "errores_comunicacion", "ultimo_timestamp")
+    
+    def __init__(self):
+        self.atendidos = 0
+        self.rechazados_facultad = 0
+        self.rechazados_servidor = 0
+        self.errores_comunicacion = 0
+        self.ultimo_timestamp = 0.0  # time.time(); se formatea al generar el reporte
 
 class MonitorMetricasPrograma:
     """
@@ -31,29 +74,54 @@ class MonitorMetricasPrograma:
         self.archivo_metricas = archivo_metricas
         self.lock = threading.Lock()
         
+        # Facultades y programas internados como enteros; la clave de cada
+        # programa empaqueta ambos ids en un solo int (facultad << 32 | programa)
+        self._ids_facultad = {}
+        self._ids_programa = {}
+        self._nombres_facultad = []
+        self._nombres_programa = []
+        
         # Estructura de datos para métricas por programa
-        # Formato: {clave_programa: {datos_del_programa}}
-        self.requerimientos_por_programa = defaultdict(lambda: {
-            'atendidos_satisfactoriamente': 0,
-            'rechazados_por_facultad': 0,
-            'rechazados_por_servidor': 0,
-            'errores_comunicacion': 0,
-            'facultad': '',
-            'ultimo_timestamp': ''
-        })
+        # Formato: {clave_programa: _RegistroPrograma}
+        self.requerimientos_por_programa = defaultdict(_RegistroPrograma)
+        
+        # Eventos aún no consolidados: (facultad, programa, contador, instante).
+        # deque.append es atómico, así que registrar no necesita tomar el lock
+        self._eventos = deque()
+        
+        # Bloques de texto ya formateados por programa, reutilizados entre
+        # reportes mientras los contadores del programa no cambien. Caché de
+        # correspondencia directa: cada ranura guarda (clave, bloque)
+        self._cache_bloques = [None] * MAX_BLOQUES_CACHE
+        
+        # Manejador persistente del archivo de métricas (se abre en la primera escritura)
+        self._archivo = None
+        self._lock_archivo = threading.Lock()
     
     def _generar_clave_programa(self, facultad, programa):
         """
         Genera una clave única para identificar un programa específico.
         
+        Cada nombre nuevo recibe el siguiente id entero; las llamadas
+        siguientes solo hacen dos búsquedas en diccionario, sin construir ni
+        hashear cadenas nuevas. Llamar con self.lock tomado.
+        
         Args:
             facultad (str): Nombre de la facultad
             programa (str): Nombre del programa académico
             
         Returns:
-            str: Clave única en formato "facultad|programa"
+            int: Clave única (id_facultad << 32) | id_programa
         """
-        return f"{facultad}|{programa}"
+        id_facultad = self._ids_facultad.get(facultad)
+        if id_facultad is None:
+            id_facultad = self._ids_facultad[facultad] = len(self._nombres_facultad)
+            self._nombres_facultad.append(facultad)
+        id_programa = self._ids_programa.get(programa)
+        if id_programa is None:
+            id_programa = self._ids_programa[programa] = len(self._nombres_programa)
+            self._nombres_programa.append(programa)
+        return (id_facultad << 32) | id_programa
     
     def registrar_requerimiento_atendido_satisfactoriamente(self, facultad, programa):
         """
@@ -63,11 +131,7 @@ class MonitorMetricasPrograma:
             facultad (str): Nombre de la facultad
             programa (str): Nombre del programa académico
         """
-        with self.lock:
-            clave = self._generar_clave_programa(facultad, programa)
-            self.requerimientos_por_programa[clave]['atendidos_satisfactoriamente'] += 1
-            self.requerimientos_por_programa[clave]['facultad'] = facultad
-            self.requerimientos_por_programa[clave]['ultimo_timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._registrar_evento(facultad, programa, ATENDIDOS)
     
     def registrar_requerimiento_rechazado_por_facultad(self, facultad, programa, motivo=""):
         """
@@ -78,11 +142,7 @@ class MonitorMetricasPrograma:
             programa (str): Nombre del programa académico
             motivo (str): Motivo del rechazo (opcional)
         """
-        with self.lock:
-            clave = self._generar_clave_programa(facultad, programa)
-            self.requerimientos_por_programa[clave]['rechazados_por_facultad'] += 1
-            self.requerimientos_por_programa[clave]['facultad'] = facultad
-            self.requerimientos_por_programa[clave]['ultimo_timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._registrar_evento(facultad, programa, RECHAZADOS_FACULTAD)
     
     def registrar_requerimiento_rechazado_por_servidor(self, facultad, programa, motivo=""):
         """
@@ -93,11 +153,7 @@ class MonitorMetricasPrograma:
             programa (str): Nombre del programa académico
             motivo (str): Motivo del rechazo (opcional)
         """
-        with self.lock:
-            clave = self._generar_clave_programa(facultad, programa)
-            self.requerimientos_por_programa[clave]['rechazados_por_servidor'] += 1
-            self.requerimientos_por_programa[clave]['facultad'] = facultad
-            self.requerimientos_por_programa[clave]['ultimo_timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._registrar_evento(facultad, programa, RECHAZADOS_SERVIDOR)
     
     def registrar_error_comunicacion_programa(self, facultad, programa, tipo_error=""):
         """
@@ -108,11 +164,35 @@ class MonitorMetricasPrograma:
             programa (str): Nombre del programa académico
             tipo_error (str): Tipo de error ocurrido (opcional)
         """
-        with self.lock:
-            clave = self._generar_clave_programa(facultad, programa)
-            self.requerimientos_por_programa[clave]['errores_comunicacion'] += 1
-            self.requerimientos_por_programa[clave]['facultad'] = facultad
-            self.requerimientos_por_programa[clave]['ultimo_timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._registrar_evento(facultad, programa, ERRORES_COMUNICACION)
+    
+    def _registrar_evento(self, facultad, programa, contador):
+        """
+        Encola un evento para un programa sin tomar el lock.
+        
+        Los eventos se suman a los contadores al consolidar: al calcular las
+        métricas o, si la cola crece, aquí mismo cuando el lock está libre.
+        """
+        eventos = self._eventos
+        eventos.append((facultad, programa, contador, time.time()))
+        if len(eventos) >= EVENTOS_POR_CONSOLIDACION and self.lock.acquire(blocking=False):
+            try:
+                self._consolidar_eventos()
+            finally:
+                self.lock.release()
+    
+    def _consolidar_eventos(self):
+        """Suma los eventos encolados a los contadores (llamar con self.lock tomado)."""
+        eventos = self._eventos
+        requerimientos = self.requerimientos_por_programa
+        while True:
+            try:
+                facultad, programa, contador, instante = eventos.popleft()
+            except IndexError:
+                break
+            datos = requerimientos[self._generar_clave_programa(facultad, programa)]
+            setattr(datos, contador, getattr(datos, contador) + 1)
+            datos.ultimo_timestamp = instante
     
     def calcular_metricas_por_programa(self):
         """
@@ -121,43 +201,53 @@ class MonitorMetricasPrograma:
         Returns:
             dict: Diccionario con métricas calculadas por programa
         """
+        # Bajo el lock solo se copian los contadores; porcentajes, nombres y
+        # fechas se calculan después sin bloquear a quienes registran
         with self.lock:
-            metricas_calculadas = {}
+            self._consolidar_eventos()
+            nombres_facultad = self._nombres_facultad
+            nombres_programa = self._nombres_programa
+            contadores = [
+                (nombres_facultad[clave >> 32], nombres_programa[clave & 0xFFFFFFFF],
+                 datos.atendidos, datos.rechazados_facultad, datos.rechazados_servidor,
+                 datos.errores_comunicacion, datos.ultimo_timestamp)
+                for clave, datos in self.requerimientos_por_programa.items()
+            ]
+        
+        metricas_calculadas = {}
+        for (facultad, programa, atendidos, rechazados_facultad,
+             rechazados_servidor, errores, ultimo_timestamp) in contadores:
+            total_requerimientos = (
+                atendidos +
+                rechazados_facultad +
+                rechazados_servidor +
+                errores
+            )
             
-            for clave, datos in self.requerimientos_por_programa.items():
-                facultad, programa = clave.split('|', 1)
-                
-                total_requerimientos = (
-                    datos['atendidos_satisfactoriamente'] +
-                    datos['rechazados_por_facultad'] +
-                    datos['rechazados_por_servidor'] +
-                    datos['errores_comunicacion']
-                )
-                
-                if total_requerimientos > 0:
-                    porcentaje_exito = (datos['atendidos_satisfactoriamente'] / total_requerimientos) * 100
-                    porcentaje_rechazo_facultad = (datos['rechazados_por_facultad'] / total_requerimientos) * 100
-                    porcentaje_rechazo_servidor = (datos['rechazados_por_servidor'] / total_requerimientos) * 100
-                    porcentaje_errores = (datos['errores_comunicacion'] / total_requerimientos) * 100
-                else:
-                    porcentaje_exito = porcentaje_rechazo_facultad = porcentaje_rechazo_servidor = porcentaje_errores = 0
-                
-                metricas_calculadas[clave] = {
-                    'facultad': facultad,
-                    'programa': programa,
-                    'atendidos_satisfactoriamente': datos['atendidos_satisfactoriamente'],
-                    'rechazados_por_facultad': datos['rechazados_por_facultad'],
-                    'rechazados_por_servidor': datos['rechazados_por_servidor'],
-                    'errores_comunicacion': datos['errores_comunicacion'],
-                    'total_requerimientos': total_requerimientos,
-                    'porcentaje_exito': porcentaje_exito,
-                    'porcentaje_rechazo_facultad': porcentaje_rechazo_facultad,
-                    'porcentaje_rechazo_servidor': porcentaje_rechazo_servidor,
-                    'porcentaje_errores': porcentaje_errores,
-                    'ultimo_timestamp': datos['ultimo_timestamp']
-                }
+            if total_requerimientos > 0:
+                porcentaje_exito = (atendidos / total_requerimientos) * 100
+                porcentaje_rechazo_facultad = (rechazados_facultad / total_requerimientos) * 100
+                porcentaje_rechazo_servidor = (rechazados_servidor / total_requerimientos) * 100
+                porcentaje_errores = (errores / total_requerimientos) * 100
+            else:
+                porcentaje_exito = porcentaje_rechazo_facultad = porcentaje_rechazo_servidor = porcentaje_errores = 0
             
-            return metricas_calculadas
+            metricas_calculadas[f"{facultad}|{programa}"] = {
+                'facultad': facultad,
+                'programa': programa,
+                'atendidos_satisfactoriamente': atendidos,
+                'rechazados_por_facultad': rechazados_facultad,
+                'rechazados_por_servidor': rechazados_servidor,
+                'errores_comunicacion': errores,
+                'total_requerimientos': total_requerimientos,
+                'porcentaje_exito': porcentaje_exito,
+                'porcentaje_rechazo_facultad': porcentaje_rechazo_facultad,
+                'porcentaje_rechazo_servidor': porcentaje_rechazo_servidor,
+                'porcentaje_errores': porcentaje_errores,
+                'ultimo_timestamp': marca_tiempo(ultimo_timestamp)
+            }
+        
+        return metricas_calculadas
     
     def generar_reporte_por_programa(self):
         """
@@ -166,11 +256,13 @@ class MonitorMetricasPrograma:
         Returns:
             str: Reporte formateado como string
         """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = marca_tiempo()
         metricas = self.calcular_metricas_por_programa()
         
+        encabezado = f"--- REPORTE POR PROGRAMA - {timestamp} ---\n\n"
+        
         if not metricas:
-            return f"--- REPORTE POR PROGRAMA - {timestamp} ---\n\n3. MÉTRICAS POR PROGRAMA:\n\n   📊 No hay datos de programas registrados aún.\n\n"
+            return encabezado + _TITULO_SECCION + _SIN_DATOS
         
         # Agrupar por facultad
         facultades = defaultdict(list)
@@ -178,49 +270,86 @@ class MonitorMetricasPrograma:
             facultades[datos['facultad']].append(datos)
         
         # Generar reporte
-        reporte = f"--- REPORTE POR PROGRAMA - {timestamp} ---\n\n"
-        reporte += "3. MÉTRICAS POR PROGRAMA:\n\n"
+        partes = [encabezado, _TITULO_SECCION]
         
         for facultad, programas in facultades.items():
-            reporte += f"   📚 FACULTAD: {facultad}\n"
-            reporte += "   " + "-" * 50 + "\n"
+            partes.append(f"   📚 FACULTAD: {facultad}\n")
+            partes.append(_SEPARADOR_FACULTAD)
             
             for programa_data in programas:
-                reporte += f"   🎓 Programa: {programa_data['programa']}\n"
-                reporte += f"      • Requerimientos atendidos satisfactoriamente: {programa_data['atendidos_satisfactoriamente']}\n"
-                reporte += f"      • Requerimientos rechazados por facultad: {programa_data['rechazados_por_facultad']}\n"
-                reporte += f"      • Requerimientos rechazados por servidor: {programa_data['rechazados_por_servidor']}\n"
-                reporte += f"      • Errores de comunicación: {programa_data['errores_comunicacion']}\n"
-                reporte += f"      • Total de requerimientos: {programa_data['total_requerimientos']}\n"
-                reporte += f"      • Porcentaje de éxito: {programa_data['porcentaje_exito']:.1f}%\n"
-                reporte += f"      • Porcentaje rechazo facultad: {programa_data['porcentaje_rechazo_facultad']:.1f}%\n"
-                reporte += f"      • Porcentaje rechazo servidor: {programa_data['porcentaje_rechazo_servidor']:.1f}%\n"
-                reporte += f"      • Porcentaje errores: {programa_data['porcentaje_errores']:.1f}%\n"
-                reporte += f"      • Último registro: {programa_data['ultimo_timestamp']}\n\n"
-        
-        return reporte
+                partes.append(self._formatear_bloque_programa(programa_data))
+        
+        return "".join(partes)
+    
+    def _formatear_bloque_programa(self, programa_data):
+        """
+        Retorna el bloque de texto del reporte para un programa, reutilizando
+        el último formateado si sus contadores no han cambiado.
+        
+        Args:
+            programa_data (dict): Métricas calculadas del programa
+            
+        Returns:
+            str: Bloque del programa en el reporte
+        """
+        clave_cache = (
+            programa_data['facultad'],
+            programa_data['programa'],
+            programa_data['atendidos_satisfactoriamente'],
+            programa_data['rechazados_por_facultad'],
+            programa_data['rechazados_por_servidor'],
+            programa_data['errores_comunicacion'],
+            programa_data['ultimo_timestamp']
+        )
+        # La ranura depende solo del programa, así que un programa actualizado
+        # reemplaza su propio bloque anterior
+        indice = hash((programa_data['facultad'], programa_data['programa'])) & (MAX_BLOQUES_CACHE - 1)
+        entrada = self._cache_bloques[indice]
+        if entrada is not None and entrada[0] == clave_cache:
+            return entrada[1]
+        
+        bloque = _PLANTILLA_BLOQUE_PROGRAMA.format_map(programa_data)
+        self._cache_bloques[indice] = (clave_cache, bloque)
+        return bloque
     
     def _escribir_reporte_programa_archivo(self, reporte):
         """
         Escribe el reporte de métricas por programa al archivo.
         
+        El reporte se escribe al generarse (una llamada write sobre el
+        manejador persistente sin búfer), sin retenerlo en memoria.
+        
         Args:
             reporte (str): Contenido del reporte a escribir
+            
+        Returns:
+            bool: True si el reporte quedó escrito en el archivo
         """
         try:
-            with open(self.archivo_metricas, "a", encoding="utf-8") as archivo:
-                archivo.write(reporte)
-                archivo.flush()
+            datos = codificar_texto(reporte)
+            with self._lock_archivo:
+                if self._archivo is None:
+                    self._archivo = open(self.archivo_metricas, "ab", buffering=0)
+                self._archivo.write(datos)
+            return True
         except Exception as e:
             print(f"❌ Error al escribir reporte por programa: {e}")
+            return False
+    
+    def cerrar_archivo(self):
+        """Cierra el archivo de métricas si está abierto."""
+        with self._lock_archivo:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
     
     def guardar_reporte_por_programa(self):
         """
         Genera y guarda un reporte de métricas por programa en el archivo.
         """
         reporte = self.generar_reporte_por_programa()
-        self._escribir_reporte_programa_archivo(reporte)
-        print(f"📊 Reporte por programa guardado en {self.archivo_metricas}")
+        if self._escribir_reporte_programa_archivo(reporte):
+            print(f"📊 Reporte por programa guardado en {self.archivo_metricas}")
 
 # Instancia global del monitor de métricas por programa
 _monitor_programa_global = None
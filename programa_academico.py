@@ -1,51 +1,56 @@
+import re
+import sys
 import zmq
-import json
-import os
-from config import FACULTAD_SERVERS, FACULTADES_FILE
+import zmq.asyncio
+from config import FACULTAD_SERVERS, SOCKETS_POR_FACULTAD_MAX, SOLICITUDES_EN_VUELO_POR_FACULTAD
+from config import CACHE_RESPUESTAS_PROGRAMA, RESPUESTAS_CACHEADAS_MAX
 import logging
+import logging.handlers
 import argparse
+import asyncio
 import random
 import time
 import threading
 import uuid
+import atexit
+import queue
+from collections import deque, OrderedDict
 from monitor_metricas import obtener_monitor
 from monitor_metricas_programa import obtener_monitor_programa
+from serializacion import serializar, deserializar
+from catalogo_facultades import cargar_facultades
 
-# =============================================================================
-# Funciones de carga y validación de datos
-# =============================================================================
+# Contexto ZMQ compartido del proceso: se termina una sola vez al salir,
+# no en cada solicitud (term() bloquea hasta cerrar sockets e hilos de E/S)
+atexit.register(lambda: zmq.Context.instance().term())
 
-def cargar_facultades():
-    """
-    Carga las facultades y programas académicos desde el archivo de texto.
-    
-    Returns:
-        dict: Diccionario con las facultades y sus programas académicos.
-    """
-    facultades = {}
-    if not os.path.exists(FACULTADES_FILE):
-        print(f"\n❌ Error: No se encontró el archivo '{FACULTADES_FILE}'.")
-        return facultades
+# Elementos de la lista de facultades escrita por el usuario: lo que queda
+# entre comas y espacios (las comas repetidas no generan elementos vacíos)
+_ELEMENTO_LISTA = re.compile(r"[^,\s]+")
 
-    try:
-        with open(FACULTADES_FILE, "r", encoding="utf-8") as file:
-            for line in file:
-                data = line.strip().split(", ")
-                if len(data) < 2:
-                    print(f"\n⚠️ Advertencia: Línea mal formada en '{FACULTADES_FILE}': {line.strip()}")
-                    continue
-                facultad = data[0]
-                programas = data[1:]
-                facultades[facultad] = programas
-    except Exception as e:
-        print(f"\n❌ Error al leer el archivo '{FACULTADES_FILE}': {e}")
+# Respuestas recibidas por solicitud (LRU), solo con CACHE_RESPUESTAS_PROGRAMA:
+# {tupla ordenada de los campos de la solicitud: respuesta serializada}
+_respuestas_cacheadas = OrderedDict()
 
-    return facultades
+# Segundos que el modo interactivo espera la respuesta de cada solicitud
+PLAZO_RESPUESTA = 5.0
 
 # =============================================================================
 # Funciones de interacción con el usuario
 # =============================================================================
 
+def confirmar(mensaje):
+    """
+    Hace una pregunta de sí/no al usuario.
+    
+    Args:
+        mensaje (str): Pregunta a mostrar
+    
+    Returns:
+        bool: True si la respuesta es "s" (sin distinguir mayúsculas)
+    """
+    return input(mensaje).strip() in ("s", "S")
+
 def solicitar_numero(mensaje, minimo=1, maximo=None):
     """
     Solicita un número al usuario con validación de rango.
@@ -59,21 +64,47 @@ def solicitar_numero(mensaje, minimo=1, maximo=None):
         int: Número válido ingresado por el usuario
     """
     while True:
-        try:
-            valor = int(input(mensaje))
-            if maximo and (valor < minimo or valor > maximo):
-                print(f"\n❌ Error: Ingrese un número entre {minimo} y {maximo}.")
-            else:
-                return valor
-        except ValueError:
+        texto = input(mensaje).strip()
+        # Validar antes de convertir: una entrada errónea no lanza excepción
+        digitos = texto[1:] if texto[:1] == "-" else texto
+        if not digitos.isdecimal():
             print("\n❌ Error: Debe ingresar un número válido.")
+            continue
+        valor = int(texto)
+        if maximo is None:
+            if valor >= minimo:
+                return valor
+            print(f"\n❌ Error: Ingrese un número mayor o igual a {minimo}.")
+        elif minimo <= valor <= maximo:
+            return valor
+        else:
+            print(f"\n❌ Error: Ingrese un número entre {minimo} y {maximo}.")
+
+def construir_menu_facultades(facultades):
+    """
+    Prepara una sola vez los nombres y el texto del menú de facultades.
+    
+    Args:
+        facultades (dict): Diccionario de facultades y programas
+    
+    Returns:
+        tuple: (nombres en el orden mostrado, texto completo del menú)
+    """
+    nombres = tuple(facultades)
+    menu = "\n".join(
+        ["\n" + "=" * 50, "Facultades disponibles:", "=" * 50]
+        + [f"{i}. {facultad}" for i, facultad in enumerate(nombres, 1)]
+    )
+    return nombres, menu
 
-def seleccionar_facultades_y_programas(facultades):
+def seleccionar_facultades_y_programas(facultades, nombres, menu):
     """
     Permite al usuario seleccionar facultades y programas.
     
     Args:
         facultades (dict): Diccionario de facultades y programas
+        nombres (tuple): Nombres de facultades, de construir_menu_facultades()
+        menu (str): Texto del menú, de construir_menu_facultades()
     
     Returns:
         list: Lista de tuplas (facultad, programas) seleccionadas
@@ -82,19 +113,16 @@ def seleccionar_facultades_y_programas(facultades):
         print("\n❌ No hay facultades disponibles.")
         return []
 
-    print("\n" + "=" * 50)
-    print("Facultades disponibles:")
-    print("=" * 50)
-    for i, facultad in enumerate(facultades.keys(), 1):
-        print(f"{i}. {facultad}")
+    print(menu)
 
-    indices = input("\nIngrese los números de las facultades separados por comas: ").split(",")
+    indices = _ELEMENTO_LISTA.findall(input("\nIngrese los números de las facultades separados por comas: "))
     seleccionadas = []
     for i in indices:
-        try:
-            facultad = list(facultades.keys())[int(i) - 1]
+        indice = int(i) - 1 if i.isdecimal() else -1
+        if 0 <= indice < len(nombres):
+            facultad = nombres[indice]
             seleccionadas.append((facultad, facultades[facultad]))
-        except (ValueError, IndexError):
+        else:
             print(f"\n⚠️ Advertencia: Número inválido ({i}).")
     
     return seleccionadas
@@ -118,15 +146,19 @@ def mostrar_asignacion(asignacion):
         print("\n⚠️ No hay disponibilidad para la solicitud:", asignacion["noDisponible"])
         return
     
-    print("\n" + "#" * 50)
-    print(f"✅ Programa: {asignacion['programa']}")
-    print(f"📌 Facultad: {asignacion['facultad']}")
-    print(f"📚 Semestre: {asignacion['semestre']}")
-    print(f"🏫 Salones asignados: {asignacion['salones_asignados']}")
-    print(f"🔬 Laboratorios asignados: {asignacion['laboratorios_asignados']}")
-    if "notificacion" in asignacion:
-        print(f"\n⚠️ {asignacion['notificacion']}")
-    print("#" * 50)
+    # Bloque completo en una sola escritura (print haría una segunda para el
+    # salto de línea final): una respuesta por llamada a stdout
+    notificacion = f"\n⚠️ {asignacion['notificacion']}\n" if "notificacion" in asignacion else ""
+    sys.stdout.write(
+        f"\n{'#' * 50}\n"
+        f"✅ Programa: {asignacion['programa']}\n"
+        f"📌 Facultad: {asignacion['facultad']}\n"
+        f"📚 Semestre: {asignacion['semestre']}\n"
+        f"🏫 Salones asignados: {asignacion['salones_asignados']}\n"
+        f"🔬 Laboratorios asignados: {asignacion['laboratorios_asignados']}\n"
+        f"{notificacion}"
+        f"{'#' * 50}\n"
+    )
 
 # =============================================================================
 # Funciones de procesamiento de solicitudes
@@ -209,96 +241,212 @@ def mostrar_error_amigable(codigo_error):
     }
     print(f"\n❌ {mensajes.get(codigo_error, 'Error desconocido')}")
 
-def enviar_solicitudes(solicitudes, sockets):
+def _clave_solicitud(solicitud):
+    """Clave de caché de una solicitud: sus campos (valores escalares) ordenados."""
+    return tuple(sorted(solicitud.items()))
+
+def _respuesta_cacheada(solicitud):
+    """Retorna la respuesta serializada ya recibida para la solicitud, o None."""
+    clave = _clave_solicitud(solicitud)
+    respuesta = _respuestas_cacheadas.get(clave)
+    if respuesta is not None:
+        _respuestas_cacheadas.move_to_end(clave)
+    return respuesta
+
+def _cachear_respuesta(solicitud, respuesta):
+    """Guarda la respuesta de una solicitud, descartando la menos usada si hace falta."""
+    _respuestas_cacheadas[_clave_solicitud(solicitud)] = respuesta
+    if len(_respuestas_cacheadas) > RESPUESTAS_CACHEADAS_MAX:
+        _respuestas_cacheadas.popitem(last=False)
+
+def enviar_solicitudes(solicitudes, sockets, poller):
     """
     Envía las solicitudes a los servidores y procesa las respuestas.
     
+    Cada servidor de facultad tiene su propio socket DEALER y admite hasta
+    SOLICITUDES_EN_VUELO_POR_FACULTAD solicitudes sin responder. La siguiente
+    solicitud se envía al servidor con menos solicitudes en vuelo, y cada
+    respuesta libera capacidad en el servidor que la produjo, así un servidor
+    lento no retiene solicitudes que otro podría atender. Cada solicitud viaja
+    con su id como marco de envoltura, que el socket ROUTER del servidor
+    devuelve intacto con la respuesta.
+    
+    Cada solicitud tiene su propio plazo de PLAZO_RESPUESTA segundos desde su
+    envío. La que lo agota se da por fallida y su servidor deja de recibir
+    solicitudes en este lote, sin detener las respuestas de los demás.
+    
+    Con CACHE_RESPUESTAS_PROGRAMA activo, las solicitudes idénticas a una ya
+    atendida muestran la respuesta guardada sin enviarse.
+    
     Args:
         solicitudes (list): Lista de solicitudes a procesar
-        sockets (list): Lista de sockets ZMQ conectados
+        sockets (list): Sockets DEALER, uno por servidor de facultad
+        poller (zmq.Poller): Poller con los sockets registrados para POLLIN;
+            solo se recibe de los sockets que tienen una respuesta lista
     """
     # Obtener monitor de métricas
     monitor = obtener_monitor()
     
-    # Contador de solicitudes pendientes con lock para sincronización
-    pending_count = [threading.Lock(), 0]
-    
-    server_index = 0
+    por_enviar = deque()
     for solicitud in solicitudes:
-        socket = sockets[server_index]
-        
-        # Generar ID único para la solicitud y registrar inicio
-        id_solicitud = str(uuid.uuid4())
-        facultad = solicitud.get("facultad", "Desconocida")
-        programa = solicitud.get("programa", "Desconocido")
+        respuesta = _respuesta_cacheada(solicitud) if CACHE_RESPUESTAS_PROGRAMA else None
+        if respuesta is None:
+            por_enviar.append(solicitud)
+        else:
+            mostrar_asignacion(deserializar(respuesta))
+    en_vuelo = dict.fromkeys(sockets, 0)
+    # id de solicitud (bytes) -> (id registrado en el monitor, socket, solicitud, plazo).
+    # Todas tienen el mismo plazo relativo, así que el orden de inserción es el
+    # de vencimiento: la primera entrada es siempre la próxima en vencer
+    pendientes = {}
+    
+    while por_enviar or pendientes:
+        # Asignar solicitudes a los servidores con capacidad libre
+        while por_enviar:
+            libres = [s for s in en_vuelo if en_vuelo[s] < SOLICITUDES_EN_VUELO_POR_FACULTAD]
+            if not libres:
+                break
+            socket = min(libres, key=en_vuelo.get)
+            solicitud = por_enviar[0]
+            id_solicitud = str(uuid.uuid4())
+            try:
+                # Envoltura [id, delimitador vacío] + solicitud, sin esperar respuesta
+                socket.send_multipart([id_solicitud.encode(), b"", serializar(solicitud)],
+                                      zmq.NOBLOCK, copy=False, track=False)
+            except zmq.ZMQError as e:
+                # Servidor sin conexión: no recibe más solicitudes en este lote
+                logging.error(f"Error de comunicación ZMQ: {str(e)}")
+                del en_vuelo[socket]
+                continue
+            por_enviar.popleft()
+            monitor.registrar_inicio_solicitud_programa(
+                id_solicitud,
+                solicitud.get("facultad", "Desconocida"),
+                solicitud.get("programa", "Desconocido")
+            )
+            pendientes[id_solicitud.encode()] = (
+                id_solicitud, socket, solicitud, time.monotonic() + PLAZO_RESPUESTA
+            )
+            en_vuelo[socket] += 1
         
-        monitor.registrar_inicio_solicitud_programa(id_solicitud, facultad, programa)
+        if not pendientes:
+            # Ningún servidor aceptó las solicitudes restantes
+            for _ in por_enviar:
+                mostrar_error_amigable(CodigosError.SERVIDOR_NO_DISPONIBLE)
+            break
         
-        try:
-            # Configurar timeout para la comunicación
-            socket.setsockopt(zmq.RCVTIMEO, 5000)  # 5 segundos de timeout
-            socket.setsockopt(zmq.SNDTIMEO, 5000)  # 5 segundos de timeout
-            
-            # Incrementar contador
-            with pending_count[0]:
-                pending_count[1] += 1
-            
-            # Intentar enviar la solicitud
-            socket.send_string(json.dumps(solicitud))
-            
-            # Esperar respuesta
-            respuesta = socket.recv_string()
+        # Esperar como máximo hasta que venza la solicitud más antigua
+        plazo = next(iter(pendientes.values()))[3]
+        eventos = poller.poll(max(0, int((plazo - time.monotonic()) * 1000) + 1))
+        for socket, _ in eventos:
+            # Vaciar las respuestas ya encoladas en el socket antes de volver a
+            # sondear (ZMQ_EVENTS no bloquea ni lanza excepción si no hay más)
+            while socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                frames = socket.recv_multipart()
+                pendiente = pendientes.pop(frames[0], None)
+                if pendiente is None:
+                    # Respuesta tardía de una solicitud ya dada por perdida
+                    continue
+                id_solicitud, _, solicitud, _ = pendiente
+                if socket in en_vuelo:
+                    en_vuelo[socket] -= 1
+                respuesta = frames[-1]
             
-            # Decrementar contador
-            with pending_count[0]:
-                pending_count[1] -= 1
+                try:
+                    asignacion = deserializar(respuesta)
+                    if "error" in asignacion:
+                        # Si el servidor de facultad reporta un error interno
+                        logging.error(f"Error del servidor: {asignacion['error']}")
+                        mostrar_error_amigable(CodigosError.FALLO_COMUNICACION_FACULTAD)
+                    else:
+                        mostrar_asignacion(asignacion)
+                        # Solo asignaciones: un rechazo por falta de aulas puede cambiar
+                        if CACHE_RESPUESTAS_PROGRAMA and "noDisponible" not in asignacion:
+                            _cachear_respuesta(solicitud, respuesta)
+                except ValueError:
+                    # Error al decodificar la respuesta
+                    logging.error(f"Respuesta malformada: {respuesta.decode('utf-8', 'replace')}")
+                    mostrar_error_amigable(CodigosError.RESPUESTA_INVALIDA)
             
-            try:
-                asignacion = json.loads(respuesta)
-                if "error" in asignacion:
-                    # Si el servidor de facultad reporta un error interno
-                    logging.error(f"Error del servidor: {asignacion['error']}")
-                    mostrar_error_amigable(CodigosError.FALLO_COMUNICACION_FACULTAD)
-                else:
-                    mostrar_asignacion(asignacion)
-                
-                # Registrar fin de solicitud exitosa
+                # Registrar fin de la solicitud (también en caso de error)
                 monitor.registrar_fin_solicitud_programa(id_solicitud)
-                    
-            except json.JSONDecodeError:
-                # Error al decodificar la respuesta
-                logging.error(f"Respuesta malformada: {respuesta}")
-                mostrar_error_amigable(CodigosError.RESPUESTA_INVALIDA)
-                # Registrar fin incluso en caso de error
-                monitor.registrar_fin_solicitud_programa(id_solicitud)
-                
-        except zmq.ZMQError as e:
-            # Error de comunicación con el servidor
-            logging.error(f"Error de comunicación ZMQ: {str(e)}")
+        
+        # Solicitudes que agotaron su plazo: su servidor no responde, así que
+        # las restantes van a los demás (una respuesta tardía se descarta)
+        ahora = time.monotonic()
+        while pendientes:
+            clave, (id_solicitud, socket, _, plazo) = next(iter(pendientes.items()))
+            if plazo > ahora:
+                break
+            del pendientes[clave]
+            en_vuelo.pop(socket, None)
+            logging.error(f"Sin respuesta del servidor para la solicitud {id_solicitud}")
             mostrar_error_amigable(CodigosError.FALLO_COMUNICACION_FACULTAD)
-            
-            # Registrar fin incluso en caso de error de comunicación
             monitor.registrar_fin_solicitud_programa(id_solicitud)
-            
-            # Decrementar contador en caso de error
-            with pending_count[0]:
-                pending_count[1] -= 1
-            
-            # Intentar reconectar el socket
-            try:
-                socket.close()
-                socket = context.socket(zmq.REQ) # type: ignore
-                socket.connect(FACULTAD_SERVERS[server_index])
-                sockets[server_index] = socket
-            except:
-                mostrar_error_amigable(CodigosError.SERVIDOR_NO_DISPONIBLE)
-        
-        # Rotar al siguiente servidor
-        server_index = (server_index + 1) % len(sockets)
+
+def crear_pool_sockets():
+    """
+    Crea un pool vacío de sockets REQ por cada servidor de facultad.
+    
+    Returns:
+        dict: URL del servidor -> queue.Queue con sockets ya conectados
+    """
+    return {url: queue.Queue(maxsize=SOCKETS_POR_FACULTAD_MAX) for url in FACULTAD_SERVERS}
+
+def tomar_socket(pool, server_url, contexto):
+    """
+    Toma un socket REQ conectado del pool, o crea uno nuevo si no hay libres.
+    
+    Args:
+        pool (dict): Pool creado con crear_pool_sockets()
+        server_url (str): URL del servidor de facultad
+        contexto (zmq.Context): Contexto con el que se crea un socket nuevo
+            (zmq.asyncio.Context en la simulación)
         
-    # Esperar a que todas las solicitudes se completen
-    time.sleep(0.5)  # Dar tiempo para que el contador se actualice
-    print("\r", end="")
+    Returns:
+        zmq.Socket: Socket REQ conectado a server_url, de uso exclusivo del llamador
+    """
+    try:
+        return pool[server_url].get_nowait()
+    except queue.Empty:
+        socket = contexto.socket(zmq.REQ)
+        # Opciones de toda la vida del socket: se fijan una sola vez al crearlo
+        socket.setsockopt(zmq.RCVTIMEO, 15000)  # 15 segundos para recibir
+        socket.setsockopt(zmq.SNDTIMEO, 5000)   # 5 segundos para enviar
+        socket.setsockopt(zmq.LINGER, 0)        # No retener mensajes al cerrar
+        # Tras un timeout el REQ admite un nuevo envío, y las respuestas
+        # tardías de la solicitud abandonada se descartan por su id
+        socket.setsockopt(zmq.REQ_RELAXED, 1)
+        socket.setsockopt(zmq.REQ_CORRELATE, 1)
+        # Solo encolar hacia una conexión establecida: con el servidor caído el
+        # envío vence por SNDTIMEO y se prueba el siguiente servidor, en lugar
+        # de esperar la respuesta hasta RCVTIMEO
+        socket.setsockopt(zmq.IMMEDIATE, 1)
+        # Con el servidor caído, libzmq duplica el intervalo entre reconexiones
+        # (desde 100 ms) hasta este tope, sin reintentos en ráfaga
+        socket.setsockopt(zmq.RECONNECT_IVL_MAX, 1000)
+        socket.connect(server_url)
+        return socket
+
+def devolver_socket(pool, server_url, socket):
+    """
+    Devuelve al pool un socket tras su ciclo envío-respuesta, completo o
+    interrumpido por un timeout (REQ_RELAXED). Si el pool está lleno, el socket
+    se cierra.
+    """
+    try:
+        pool[server_url].put_nowait(socket)
+    except queue.Full:
+        socket.close()
+
+def cerrar_pool_sockets(pool):
+    """Cierra todos los sockets que quedan en el pool."""
+    for cola in pool.values():
+        while True:
+            try:
+                cola.get_nowait().close()
+            except queue.Empty:
+                break
 
 def simulacion_mock(patron):
     """
@@ -310,11 +458,11 @@ def simulacion_mock(patron):
         return
     
 
-    # Seleccionar 5 facultades aleatoriamente
-    facultades_seleccionadas = random.sample(list(facultades_dict.keys()), 5)
+    # Seleccionar 5 facultades aleatoriamente junto con sus programas
+    facultades_seleccionadas = random.sample(list(facultades_dict.items()), 5)
     solicitudes = []
-    for facultad in facultades_seleccionadas:
-        for programa in facultades_dict[facultad]:
+    for facultad, programas in facultades_seleccionadas:
+        for programa in programas:
             if patron == 'A':
                 salones, laboratorios = 7, 2
             else:
@@ -328,9 +476,17 @@ def simulacion_mock(patron):
                 'capacidad_min': 30
             })
 
-    def proceso_programa(solicitud, pending_count):
-        # Obtener monitor de métricas y generar ID único
-        monitor = obtener_monitor()
+    # Sockets REQ reutilizados entre solicitudes en lugar de uno nuevo por envío.
+    # Son sockets asyncio sobre el contexto compartido del proceso: cada
+    # solicitud es una corrutina, no un hilo, y espera sin bloquear a las demás
+    contexto = zmq.asyncio.Context.shadow(zmq.Context.instance().underlying)
+    pool_sockets = crear_pool_sockets()
+    # Monitores de métricas, obtenidos una vez para todas las solicitudes
+    monitor = obtener_monitor()
+    monitor_programa = obtener_monitor_programa()
+
+    async def proceso_programa(solicitud, limite):
+        # Generar ID único
         id_solicitud = str(uuid.uuid4())
         facultad = solicitud.get("facultad", "Desconocida")
         programa = solicitud.get("programa", "Desconocido")
@@ -339,96 +495,79 @@ def simulacion_mock(patron):
         monitor.registrar_inicio_solicitud_programa(id_solicitud, facultad, programa)
         
         # Retardo aleatorio entre 0.1 y 2 segundos
-        time.sleep(random.uniform(0.1, 2.0))
-        context = zmq.Context()
+        await asyncio.sleep(random.uniform(0.1, 2.0))
         
         # Seleccionar servidor de facultad - intentar ambos si es necesario
         servers_to_try = list(FACULTAD_SERVERS)  # Hacer una copia para poder reordenar
         random.shuffle(servers_to_try)  # Aleatorizar el orden
         
-        # Incrementar el contador de solicitudes pendientes
-        with pending_count[0]:
-            pending_count[1] += 1
-        
         success = False
         error_message = "No hay servidores de facultad disponibles"
         
-        # Intentar enviar a los servidores disponibles
-        for server_url in servers_to_try:
-            try:
-                socket = context.socket(zmq.REQ)
-                # Configurar timeouts más adecuados
-                socket.setsockopt(zmq.RCVTIMEO, 15000)  # 15 segundos para recibir
-                socket.setsockopt(zmq.SNDTIMEO, 5000)   # 5 segundos para enviar
-                socket.setsockopt(zmq.LINGER, 1000)     # Esperar max 1 segundo al cerrar
+        # Intentar enviar a los servidores disponibles, con a lo sumo
+        # limite solicitudes en vuelo (tantas como sockets caben en el pool)
+        async with limite:
+            for server_url in servers_to_try:
+                socket = None
+                try:
+                    socket = tomar_socket(pool_sockets, server_url, contexto)
                 
-                socket.connect(server_url)
+                    await socket.send(serializar(solicitud), copy=False, track=False)
                 
-                socket.send_string(json.dumps(solicitud))
+                    # Recibir con tiempo de espera (RCVTIMEO también aplica a los sockets asyncio)
+                    respuesta = await socket.recv()
                 
-                # Recibir con tiempo de espera
-                respuesta = socket.recv_string()
+                    # Ciclo REQ completo: el socket puede reutilizarse
+                    devolver_socket(pool_sockets, server_url, socket)
                 
-                try:
-                    asignacion = json.loads(respuesta)
-                    mostrar_asignacion(asignacion)
+                    try:
+                        asignacion = deserializar(respuesta)
+                        mostrar_asignacion(asignacion)
                     
-                    # Registrar métricas por programa según el resultado
-                    monitor_programa = obtener_monitor_programa()
-                    if "error" in asignacion:
-                        monitor_programa.registrar_error_comunicacion_programa(facultad, programa, "error_servidor")
-                    elif "noDisponible" in asignacion:
-                        monitor_programa.registrar_requerimiento_rechazado_por_servidor(facultad, programa, "no_disponible")
-                    else:
-                        monitor_programa.registrar_requerimiento_atendido_satisfactoriamente(facultad, programa)
+                        # Registrar métricas por programa según el resultado
+                        if "error" in asignacion:
+                            monitor_programa.registrar_error_comunicacion_programa(facultad, programa, "error_servidor")
+                        elif "noDisponible" in asignacion:
+                            monitor_programa.registrar_requerimiento_rechazado_por_servidor(facultad, programa, "no_disponible")
+                        else:
+                            monitor_programa.registrar_requerimiento_atendido_satisfactoriamente(facultad, programa)
                     
-                    success = True
+                        success = True
                     
-                    # Registrar fin de solicitud exitosa
-                    monitor.registrar_fin_solicitud_programa(id_solicitud)
+                        # Registrar fin de solicitud exitosa
+                        monitor.registrar_fin_solicitud_programa(id_solicitud)
                     
-                    break  # Salir del bucle si tuvo éxito
-                except json.JSONDecodeError:
-                    error_message = f"Respuesta malformada: {respuesta[:100]}..."
-                    print(f"\n❌ {error_message}")
-                finally:
-                    socket.close()
+                        break  # Salir del bucle si tuvo éxito
+                    except ValueError:
+                        error_message = f"Respuesta malformada: {respuesta[:100].decode('utf-8', 'replace')}..."
+                        print(f"\n❌ {error_message}")
                     
-            except zmq.ZMQError as e:
-                error_message = f"Error de comunicación: {str(e)}"
-                print(f"\n❌ {error_message} con {server_url}")
-                # Registrar error de comunicación por programa
-                monitor_programa = obtener_monitor_programa()
-                monitor_programa.registrar_error_comunicacion_programa(facultad, programa, "zmq_error")
-                if socket:
-                    socket.close()
-                    
-        # Decrementar el contador cuando la solicitud se completa (éxito o error)
-        with pending_count[0]:
-            pending_count[1] -= 1
+                except zmq.ZMQError as e:
+                    error_message = f"Error de comunicación: {str(e)}"
+                    print(f"\n❌ {error_message} con {server_url}")
+                    # Registrar error de comunicación por programa
+                    monitor_programa.registrar_error_comunicacion_programa(facultad, programa, "zmq_error")
+                    # Con REQ_RELAXED el socket admite un nuevo envío tras el fallo:
+                    # vuelve al pool y se conserva su conexión TCP
+                    if socket:
+                        devolver_socket(pool_sockets, server_url, socket)
             
         if not success:
             print(f"\n❌ Todos los intentos fallaron para {solicitud['facultad']} - {solicitud['programa']}: {error_message}")
             # Registrar fin incluso en caso de fallo total
             monitor.registrar_fin_solicitud_programa(id_solicitud)
-            
-        context.term()
 
-    # Crear un contador compartido con un lock para evitar condiciones de carrera
-    # [lock, counter]
-    pending_count = [threading.Lock(), 0]
-
-    hilos = []
-    for solicitud in solicitudes:
-        t = threading.Thread(target=proceso_programa, args=(solicitud, pending_count))
-        t.start()
-        hilos.append(t)
+    async def simular():
+        try:
+            # Creado dentro del bucle de eventos (Python 3.8/3.9 lo ligan al crearlo)
+            limite = asyncio.Semaphore(SOCKETS_POR_FACULTAD_MAX * len(FACULTAD_SERVERS))
+            await asyncio.gather(*(proceso_programa(solicitud, limite) for solicitud in solicitudes))
+        finally:
+            # Cerrar los sockets asyncio mientras el bucle de eventos sigue activo
+            cerrar_pool_sockets(pool_sockets)
     
     print("🚀 Iniciando simulación...")
-    
-    for t in hilos:
-        t.join()
-    
+    asyncio.run(simular())
     print("✅ Simulación completada")
 
 def generar_reportes_periodicos():
@@ -474,32 +613,53 @@ def main():
         
         return
 
-    # Configurar logging
+    # Configurar logging: los registros se acumulan en memoria y se escriben
+    # al archivo en lotes de 64 (logging.shutdown vuelca el resto al salir)
+    file_handler = logging.FileHandler('programa_academico.log')
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
     logging.basicConfig(
-        filename='programa_academico.log',
         level=logging.ERROR,
-        format='%(asctime)s - %(levelname)s - %(message)s'
+        handlers=[logging.handlers.MemoryHandler(
+            capacity=64, flushLevel=logging.CRITICAL, target=file_handler
+        )]
     )
     
     facultades = cargar_facultades()
-    context = zmq.Context()
+    # Los nombres y el menú no cambian durante la sesión
+    nombres_facultades, menu_facultades = construir_menu_facultades(facultades)
+    # Un hilo de E/S de libzmq por servidor de facultad (un socket DEALER por servidor)
+    context = zmq.Context(io_threads=max(1, len(FACULTAD_SERVERS)))
     sockets = []
     
-    # Inicializar conexiones con manejo de errores
+    # Inicializar conexiones con manejo de errores: un socket DEALER por
+    # servidor, para elegir a qué servidor va cada solicitud
     for server_url in FACULTAD_SERVERS:
         try:
-            socket = context.socket(zmq.REQ)
-            socket.connect(server_url)
+            socket = context.socket(zmq.DEALER)
             sockets.append(socket)
+            socket.setsockopt(zmq.LINGER, 0)
+            # Solo encolar si la conexión con el servidor está establecida
+            socket.setsockopt(zmq.IMMEDIATE, 1)
+            # Reconexión con espera exponencial (100 ms a 1 s) si el servidor cae
+            socket.setsockopt(zmq.RECONNECT_IVL_MAX, 1000)
+            socket.connect(server_url)
         except zmq.ZMQError:
             logging.error(f"No se pudo conectar a {server_url}")
             mostrar_error_amigable(CodigosError.SERVIDOR_NO_DISPONIBLE)
+            for socket in sockets:
+                socket.close()
+            context.term()
             return
+    
+    # Poller creado una sola vez para toda la sesión
+    poller = zmq.Poller()
+    for socket in sockets:
+        poller.register(socket, zmq.POLLIN)
 
     try:
         while True:
-            solicitud_colectiva = input("\n¿Desea realizar una solicitud colectiva? (s/n): ").strip().lower() == 's'
-            seleccionadas = seleccionar_facultades_y_programas(facultades)
+            solicitud_colectiva = confirmar("\n¿Desea realizar una solicitud colectiva? (s/n): ")
+            seleccionadas = seleccionar_facultades_y_programas(facultades, nombres_facultades, menu_facultades)
             
             if not seleccionadas:
                 continue
@@ -508,9 +668,9 @@ def main():
                           if solicitud_colectiva 
                           else procesar_solicitud_individual(seleccionadas))
             
-            enviar_solicitudes(solicitudes, sockets)
+            enviar_solicitudes(solicitudes, sockets, poller)
 
-            if input("\n¿Desea realizar otra solicitud? (s/n): ").strip().lower() != 's':
+            if not confirmar("\n¿Desea realizar otra solicitud? (s/n): "):
                 break
     
     finally:
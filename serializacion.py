@@ -0,0 +1,126 @@
+"""
+serializacion.py - Codificación de los mensajes del sistema
+
+Todos los componentes (facultad, broker y servidores DTI) codifican y
+decodifican sus mensajes a través de este módulo. El formato lo fija
+FORMATO_SERIALIZACION en config.py y debe ser el mismo en todos los nodos:
+
+- "json" (por defecto): si orjson está instalado se usa su codificador en C,
+  que trabaja directamente con bytes; si no, se recurre al módulo json de la
+  biblioteca estándar produciendo la misma salida compacta en UTF-8, de modo
+  que ambos extremos son intercambiables.
+- "msgpack": formato binario con enteros tipados, más compacto y sin paso de
+  validación UTF-8 del texto completo al decodificar. Requiere msgpack.
+
+Uso básico:
+    from serializacion import serializar, deserializar
+    socket.send(serializar({"facultad": "Ingeniería"}))
+    datos = deserializar(socket.recv())
+"""
+
+import json
+
+from config import FORMATO_SERIALIZACION
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if FORMATO_SERIALIZACION == "msgpack":
+    # Sin respaldo: un nodo que hablara JSON no entendería a los demás
+    import msgpack
+elif FORMATO_SERIALIZACION != "json":
+    raise ValueError(f"FORMATO_SERIALIZACION desconocido: {FORMATO_SERIALIZACION!r}")
+
+
+if FORMATO_SERIALIZACION == "msgpack":
+    def serializar(obj):
+        """
+        Convierte un objeto a MessagePack.
+
+        Args:
+            obj: Objeto serializable (dict, list, str, int, ...)
+
+        Returns:
+            bytes: Mensaje listo para enviar por un socket
+        """
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def deserializar(datos):
+        """
+        Convierte un mensaje MessagePack recibido en el objeto correspondiente.
+
+        Args:
+            datos (bytes): Mensaje a decodificar
+
+        Returns:
+            Objeto decodificado
+
+        Raises:
+            ValueError: Si los datos no son MessagePack válido
+        """
+        try:
+            return msgpack.unpackb(datos, raw=False)
+        except (ValueError, TypeError, msgpack.UnpackException) as e:
+            raise ValueError(f"Mensaje MessagePack inválido: {e}") from e
+elif orjson is not None:
+    def serializar(obj):
+        """
+        Convierte un objeto a JSON compacto codificado en UTF-8.
+
+        Args:
+            obj: Objeto serializable (dict, list, str, int, ...)
+
+        Returns:
+            bytes: JSON listo para enviar por un socket
+        """
+        return orjson.dumps(obj)
+
+    def deserializar(datos):
+        """
+        Convierte JSON recibido (bytes o str) en el objeto correspondiente.
+
+        Args:
+            datos (bytes | str): JSON a decodificar
+
+        Returns:
+            Objeto decodificado
+
+        Raises:
+            ValueError: Si los datos no son JSON válido
+        """
+        return orjson.loads(datos)
+else:
+    # Métodos ligados una sola vez: cada llamada evita buscar el atributo
+    _codificar = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+    _decodificar = json.JSONDecoder().decode
+
+    def serializar(obj):
+        """
+        Convierte un objeto a JSON compacto codificado en UTF-8.
+
+        Args:
+            obj: Objeto serializable (dict, list, str, int, ...)
+
+        Returns:
+            bytes: JSON listo para enviar por un socket
+        """
+        return _codificar(obj).encode("utf-8")
+
+    def deserializar(datos):
+        """
+        Convierte JSON recibido (bytes o str) en el objeto correspondiente.
+
+        Args:
+            datos (bytes | str): JSON a decodificar
+
+        Returns:
+            Objeto decodificado
+
+        Raises:
+            ValueError: Si los datos no son JSON válido
+        """
+        if isinstance(datos, (bytes, bytearray, memoryview)):
+            datos = bytes(datos).decode("utf-8")
+        return _decodificar(datos)